@@ -1,16 +1,29 @@
 #A2 Test Cases
 #fixtures
 from typing import List, Optional, Tuple
+import io
+import math
 import os
+import random
+import subprocess
+import sys
 import pygame
 import pytest
 
-from block import Block
-from blocky import _block_to_squares
+from block import Block, CHILD_OFFSETS, cell_at, cell_start, decode_board, \
+    generate_board, read_boards, write_boards
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PAINT, COMBINE, PASS, ACTION_PENALTY
+from blocky import GameData, _block_to_squares
+import goal
 from goal import BlobGoal, PerimeterGoal, _flatten, generate_goals
-from player import _get_block
+from player import MonteCarloPlayer, RandomPlayer, SearchPlayer, SmartPlayer, \
+    _BlockIndex, _get_block, legal_moves, random_move
 from renderer import Renderer
-from settings import COLOUR_LIST
+from simulation import simulate
+from tournament import create_player, play_game, run_tournament, win_rates, \
+    write_results, main as tournament_main
+from settings import COLOUR_LIST, MAX_DEPTH
 
 @pytest.fixture
 def board_1x1() -> Block:
@@ -195,6 +208,146 @@ def test_undiscovered_blob_size(board_16x16) -> None:
     assert goal._undiscovered_blob_size((0, 3), flattened, visited) == 1
 
 
+def _reference_blob_score(goal: BlobGoal, board: Block) -> int:
+    flattened = _flatten(board)
+    visited = [[-1] * len(flattened) for _ in range(len(flattened))]
+    best = 0
+    for i in range(len(flattened)):
+        for j in range(len(flattened)):
+            best = max(best, goal._undiscovered_blob_size((i, j), flattened,
+                                                          visited))
+    return best
+
+
+def test_blob_incremental() -> None:
+    random.seed(148)
+    board = generate_board(4, 750)
+    goals = [BlobGoal(colour) for colour in COLOUR_LIST]
+    for goal in goals:
+        assert goal.score(board) == _reference_blob_score(goal, board)
+
+    for _ in range(200):
+        block = _get_block(board, (random.randint(0, 749),
+                                   random.randint(0, 749)),
+                           random.randint(0, 4))
+        move = random.randint(0, 4)
+        if move == 0:
+            block.rotate(random.choice([1, 3]))
+        elif move == 1:
+            block.swap(random.randint(0, 1))
+        elif move == 2:
+            block.smash()
+        elif move == 3:
+            block.paint(random.choice(COLOUR_LIST))
+        else:
+            block.combine()
+        for goal in goals:
+            assert goal.score(board) == _reference_blob_score(goal, board)
+
+    copy = board.create_copy()
+    copy.children[0].rotate(1)
+    for goal in goals:
+        assert goal.score(copy) == _reference_blob_score(goal, copy)
+        assert goal.score(board) == _reference_blob_score(goal, board)
+
+    # The copy and the board share the columns neither of them has changed
+    assert board.children[1].swap(0)
+    assert copy.children[2].rotate(3) or copy.children[2].smash()
+    for goal in goals:
+        assert goal.score(copy) == _reference_blob_score(goal, copy)
+        assert goal.score(board) == _reference_blob_score(goal, board)
+
+
+def test_direct_writes() -> None:
+    random.seed(4)
+    board = generate_board(3, 750)
+    goals = [BlobGoal(c) for c in COLOUR_LIST] + \
+        [PerimeterGoal(c) for c in COLOUR_LIST]
+    for g in goals:
+        g.score(board)
+
+    leaf = board
+    while leaf.children:
+        leaf = leaf.children[-1]
+    leaf.colour = COLOUR_LIST[(COLOUR_LIST.index(leaf.colour) + 1) % 4]
+    assert [g.score(board) for g in goals] == \
+        [g.score(decode_board(board.encode())) for g in goals]
+
+    # The Block has no children until set_children has added all four
+    set_children(board.children[1], COLOUR_LIST)
+    assert [g.score(board) for g in goals] == \
+        [g.score(decode_board(board.encode())) for g in goals]
+
+    # Changing the list of children in place is not noticed, so the scores
+    # stay as they were until the Block is changed through a method
+    scores = [g.score(board) for g in goals]
+    children = board.children[1].children
+    children[0], children[2] = children[2], children[0]
+    assert [g.score(board) for g in goals] == scores
+    assert [g.score(decode_board(board.encode())) for g in goals] != scores
+    board.children[1].children = list(children)
+    assert [g.score(board) for g in goals] == \
+        [g.score(decode_board(board.encode())) for g in goals]
+
+
+def test_blob_deep_board() -> None:
+    board = Block((0, 0), 750, COLOUR_LIST[3], 0, 8)
+    assert BlobGoal(COLOUR_LIST[3]).score(board) == 256 * 256
+    assert BlobGoal(COLOUR_LIST[0]).score(board) == 0
+
+    flattened = _flatten(board)
+    visited = [[-1] * 256 for _ in range(256)]
+    goal = BlobGoal(COLOUR_LIST[3])
+    assert goal._undiscovered_blob_size((5, 7), flattened, visited) == \
+        256 * 256
+    assert all(cell == 1 for column in visited for cell in column)
+
+
+def test_array_mode(monkeypatch) -> None:
+    random.seed(2020)
+    for depth in range(0, 6):
+        board = generate_board(depth, 750)
+        for colour in COLOUR_LIST:
+            monkeypatch.setattr(goal, 'ARRAY_MODE', False)
+            perimeter = PerimeterGoal(colour).score(board)
+            blob = BlobGoal(colour).score(board.create_copy())
+            monkeypatch.setattr(goal, 'ARRAY_MODE', True)
+            assert PerimeterGoal(colour).score(board) == perimeter
+            assert BlobGoal(colour).score(board.create_copy()) == blob
+            assert blob == _reference_blob_score(BlobGoal(colour), board)
+
+        cells = goal._flatten_array(board)
+        assert cells.dtype == 'uint8'
+        assert cells.tolist() == [[COLOUR_LIST.index(c) for c in column]
+                                  for column in _flatten(board)]
+
+
+def test_flatten_cache(board_16x16) -> None:
+    flattened = _flatten(board_16x16)
+    assert _flatten(board_16x16) is flattened
+    untouched = _flatten(board_16x16.children[1])
+
+    board_16x16.children[0].rotate(1)
+    assert _flatten(board_16x16.children[1]) is untouched
+    assert _flatten(board_16x16) == [
+        [COLOUR_LIST[2], COLOUR_LIST[2], COLOUR_LIST[1], COLOUR_LIST[1]],
+        [COLOUR_LIST[2], COLOUR_LIST[2], COLOUR_LIST[1], COLOUR_LIST[1]],
+        [COLOUR_LIST[1], COLOUR_LIST[3], COLOUR_LIST[3], COLOUR_LIST[3]],
+        [COLOUR_LIST[1], COLOUR_LIST[0], COLOUR_LIST[3], COLOUR_LIST[3]]
+    ]
+
+    copy = board_16x16.create_copy()
+    assert _flatten(copy.children[1]) is untouched
+    copy.children[2].smash()
+    assert _flatten(board_16x16.children[2]) == [[COLOUR_LIST[1]] * 2] * 2
+    assert _flatten(copy)[0][2:] == _flatten(copy.children[2])[0]
+
+    board_16x16.children[0].children[2].paint(COLOUR_LIST[1])
+    assert _flatten(board_16x16)[2][1] == COLOUR_LIST[1]
+    board_16x16.children[0].combine()
+    assert _flatten(board_16x16)[3][:2] == [COLOUR_LIST[1]] * 2
+
+
 def test_block_to_squares(board_2x2) -> None:
     squares = set(_block_to_squares(board_2x2))
     expected = {(COLOUR_LIST[2],(0,0),750)}
@@ -202,6 +355,40 @@ def test_block_to_squares(board_2x2) -> None:
 
 
 #Block Test cases
+def _check_positions(board: Block) -> None:
+    x, y = board.position
+    for block in _blocks(board):
+        cells = 2 ** (block.level - board.level)
+        column, row = block.cell
+        assert block.position == (x + math.floor(column * board.size / cells
+                                                 + 0.5),
+                                  y + math.floor(row * board.size / cells
+                                                 + 0.5))
+        assert block.size == math.floor(board.size / cells + 0.5)
+        for child, offset in zip(block.children, CHILD_OFFSETS):
+            assert child.cell == (2 * column + offset[0], 2 * row + offset[1])
+
+
+def test_block_positions(board_16x16) -> None:
+    random.seed(1001)
+    board = generate_board(5, 750)
+    for _ in range(100):
+        block = _get_block(board, (random.randint(0, 749),
+                                   random.randint(0, 749)),
+                           random.randint(0, 5))
+        if random.randint(0, 1) == 0:
+            block.rotate(random.choice([1, 3]))
+        else:
+            block.swap(random.randint(0, 1))
+        _check_positions(board)
+    _check_positions(board.create_copy())
+
+    board_16x16.children[0].rotate(3)
+    board_16x16.swap(1)
+    _check_positions(board_16x16)
+    assert not hasattr(board_16x16, '__dict__')
+
+
 def test_block_smash(board_1x1, board_2x2, board_16x16) -> None:
     board_1x1.smash()
     assert len(board_1x1.children) == 0
@@ -240,6 +427,623 @@ def test_block_smash(board_1x1, board_2x2, board_16x16) -> None:
 
 
 
+def _blocks(block: Block) -> List[Block]:
+    result = [block]
+    for child in block.children:
+        result.extend(_blocks(child))
+    return result
+
+
+def test_snapshot() -> None:
+    random.seed(7)
+    board = generate_board(5, 750)
+    goals = [BlobGoal(c) for c in COLOUR_LIST] + \
+        [PerimeterGoal(c) for c in COLOUR_LIST]
+    scores = [g.score(board) for g in goals]
+    original = board.create_copy()
+
+    for _ in range(100):
+        block = board
+        expected = board.create_copy()
+        target = expected
+        for _ in range(random.randint(0, 5)):
+            if len(block.children) == 4:
+                i = random.randint(0, 3)
+                block, target = block.children[i], target.children[i]
+        snapshot, copy = board.snapshot(block)
+        action = random.randint(0, 4)
+        for b in (copy, target):
+            if action == 0:
+                b.rotate(1)
+            elif action == 1:
+                b.swap(0)
+            elif action == 2:
+                random.seed(block.size)
+                b.smash()
+            elif action == 3:
+                b.paint(COLOUR_LIST[0])
+            else:
+                b.combine()
+
+        assert _flatten(snapshot) == _flatten(expected)
+        assert [g.score(snapshot) for g in goals] == \
+            [g.score(expected) for g in goals]
+        new_blocks = {id(b) for b in _blocks(snapshot)} - \
+            {id(b) for b in _blocks(board)}
+        assert len(new_blocks) <= (block.level + 1) + 4 + \
+            len(_blocks(copy)) - 1
+
+    assert board == original
+    assert [g.score(board) for g in goals] == scores
+    _check_positions(board)
+
+
+def test_players_do_not_mutate() -> None:
+    random.seed(11)
+    board = generate_board(4, 750)
+    original = board.create_copy()
+    goals = generate_goals(2)
+    for p in (RandomPlayer(0, goals[0]), SmartPlayer(1, goals[1], 20)):
+        for _ in range(10):
+            p._proceed = True
+            move = p.generate_move(board)
+            assert move is not None
+            assert board == original
+
+
+def test_undo_redo() -> None:
+    random.seed(3)
+    board = generate_board(4, 750)
+    goals = generate_goals(2)
+    players = [RandomPlayer(0, goals[0]), RandomPlayer(1, goals[1])]
+    data = GameData(board, players)
+    blob = BlobGoal(COLOUR_LIST[0])
+    original = board.create_copy()
+    original_score = blob.score(board)
+
+    records = []
+    for turn in range(60):
+        block = board
+        for _ in range(random.randint(0, 4)):
+            if len(block.children) == 4:
+                block = random.choice(block.children)
+        action = random.choice([ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
+                                SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PAINT,
+                                COMBINE, PASS])
+        record = data.apply((action[0], action[1], block), turn % 2)
+        if record is not None:
+            records.append(record)
+    final = board.create_copy()
+    final_score = blob.score(board)
+    penalties = [data.calculate_score(0)[1], data.calculate_score(1)[1]]
+
+    for record in reversed(records):
+        data.undo(record)
+    assert board == original
+    assert blob.score(board) == original_score
+    assert data.calculate_score(0)[1] == data.calculate_score(1)[1] == 0
+
+    for record in records:
+        data.redo(record)
+    assert board == final
+    assert blob.score(board) == final_score
+    assert [data.calculate_score(0)[1], data.calculate_score(1)[1]] == \
+        penalties
+
+
+def _reference_blob_sizes(board: Block) -> dict:
+    flattened = _flatten(board)
+    sizes = {}
+    for colour in COLOUR_LIST:
+        goal = BlobGoal(colour)
+        visited = [[-1] * len(flattened) for _ in range(len(flattened))]
+        sizes[colour] = sorted(
+            (goal._undiscovered_blob_size((i, j), flattened, visited)
+             for i in range(len(flattened)) for j in range(len(flattened))
+             if visited[i][j] == -1 and flattened[i][j] == colour),
+            reverse=True)
+    return sizes
+
+
+def test_scoreboard() -> None:
+    random.seed(25)
+    board = generate_board(5, 750)
+    goals = [BlobGoal(COLOUR_LIST[0]), PerimeterGoal(COLOUR_LIST[1]),
+             BlobGoal(COLOUR_LIST[2]), PerimeterGoal(COLOUR_LIST[2])]
+    players = [RandomPlayer(i, g) for i, g in enumerate(goals)]
+    data = GameData(board, players)
+    for turn in range(40):
+        assert goal.score_goals(board, goals) == \
+            [g.score(board.create_copy()) for g in goals]
+        assert data.scoreboard() == \
+            [(p.id,) + data.calculate_score(p.id) for p in players]
+        assert data.blob_sizes() == _reference_blob_sizes(board)
+        player = players[turn % len(players)]
+        player.proceed()
+        data.apply(player.generate_move(board), player.id)
+
+
+def test_random_move() -> None:
+    random.seed(8)
+    board = generate_board(5, 750)
+    for turn in range(100):
+        colour = COLOUR_LIST[turn % 4]
+        state = random.getstate()
+        move = random_move(board, colour)
+        random.setstate(state)
+        expected = random.choice(list(legal_moves(board, colour)))
+        assert move[:2] == expected[:2] and move[2] is expected[2]
+        move[2].perform((move[0], move[1]), colour)
+
+    leaf = Block((0, 0), 750, COLOUR_LIST[0], 0, 0)
+    assert random_move(leaf, COLOUR_LIST[0]) is None
+    assert random_move(leaf, COLOUR_LIST[1])[0] == 'paint'
+
+
+def test_legal_moves(board_16x16) -> None:
+    moves = list(legal_moves(board_16x16, COLOUR_LIST[1]))
+    assert len(moves) == 14
+    assert sum(1 for m in moves if m[0] == 'paint') == 2
+
+    random.seed(5)
+    board = generate_board(4, 750)
+    actions = [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL,
+               SWAP_VERTICAL, SMASH, PAINT, COMBINE]
+    expected = set()
+    for block in _blocks(board):
+        for action in actions:
+            _, copy = board.snapshot(block)
+            if copy.perform(action, COLOUR_LIST[2]) is not None:
+                expected.add((action[0], action[1], id(block)))
+    moves = list(legal_moves(board, COLOUR_LIST[2]))
+    assert len(moves) == len(expected)
+    assert {(m[0], m[1], id(m[2])) for m in moves} == expected
+
+
+def _check_summary(block: Block) -> None:
+    cells = _flatten(block)
+    edges = [[column[0] for column in cells], cells[-1],
+             [column[-1] for column in cells], cells[0],
+             [cell for column in cells for cell in column]]
+    summary = goal._summary(block)
+    for i, colour in enumerate(COLOUR_LIST):
+        assert [goal._count(counts, i) for counts in summary] == \
+            [edge.count(colour) for edge in edges]
+
+
+def test_summary() -> None:
+    random.seed(24)
+    board = generate_board(4, 750)
+    for _ in range(40):
+        move = random.choice(list(legal_moves(board, COLOUR_LIST[1])))
+        children = [goal._summary(child) for child in move[2].children]
+        move[2].perform((move[0], move[1]), COLOUR_LIST[1])
+        if move[0] in ('rotate', 'swap'):
+            # Only the order of the children changed
+            assert sorted(goal._summary(child) for child in move[2].children) \
+                == sorted(children)
+        for block in _blocks(board):
+            _check_summary(block)
+    _check_summary(board.create_copy())
+
+    goals = [PerimeterGoal(COLOUR_LIST[1]), BlobGoal(COLOUR_LIST[1])]
+    for move in legal_moves(board, COLOUR_LIST[1]):
+        action = (move[0], move[1])
+        bounds = [g.upper_bound(board, move[2], action) for g in goals]
+        change = move[2].perform(action, COLOUR_LIST[1])
+        scores = [g.score(board) for g in goals]
+        change.undo()
+        assert scores[0] <= bounds[0] and scores[1] <= bounds[1]
+        if move[0] in ('rotate', 'swap', 'paint'):
+            assert scores[0] == bounds[0]
+
+
+def test_smart_player_exhaustive() -> None:
+    random.seed(9)
+    board = generate_board(4, 750)
+    original = board.create_copy()
+    for goal_type in (BlobGoal, PerimeterGoal):
+        player = SmartPlayer(0, goal_type(COLOUR_LIST[2]), 0, True)
+        moves = list(legal_moves(board, COLOUR_LIST[2]))
+        scores = player._score_all(board, moves)
+        assert board == original
+        for move, score in zip(moves, scores):
+            if move[0] != 'smash':
+                snapshot, copy = board.snapshot(move[2])
+                copy.perform((move[0], move[1]), COLOUR_LIST[2])
+                assert player.goal.score(snapshot) == score
+
+        state = random.getstate()
+        player._proceed = True
+        move = player.generate_move(board)
+        assert random.getstate() == state
+        assert player.moves_per_second > 0
+        assert 0 <= player.moves_pruned <= len(moves)
+        if max(scores) > player.goal.score(board):
+            assert move == moves[scores.index(max(scores))]
+        else:
+            assert move[0] == 'pass'
+        player._proceed = True
+        assert player.generate_move(board) == move
+        assert board == original
+
+
+def _reference_value(board: Block, goals: list, me: int, player: int,
+                     depth: int, penalties: List[int]) -> float:
+    if depth == 0:
+        scores = [g.score(board) - penalties[i] for i, g in enumerate(goals)]
+        mine = scores.pop(me)
+        return mine - max(scores) if scores else mine
+    values = []
+    moves = [(PASS[0], PASS[1], board)] + \
+        list(legal_moves(board, goals[player].colour))
+    for move in moves:
+        values.append(_reference_move(board, goals, me, player, depth,
+                                      penalties, move))
+    return max(values) if player == me else min(values)
+
+
+def _reference_move(board: Block, goals: list, me: int, player: int,
+                    depth: int, penalties: List[int], move: tuple) -> float:
+    action = (move[0], move[1])
+    change = None
+    if action != PASS:
+        change = move[2].perform(action, goals[player].colour)
+    penalties[player] += ACTION_PENALTY[action]
+    value = _reference_value(board, goals, me, (player + 1) % len(goals),
+                             depth - 1, penalties)
+    penalties[player] -= ACTION_PENALTY[action]
+    if change is not None:
+        change.undo()
+    return value
+
+
+def test_search_player() -> None:
+    random.seed(5)
+    # Smash every block so that no smash is possible while searching
+    board = Block((0, 0), 750, None, 0, 2)
+    board.smash()
+    for child in board.children:
+        child.colour = None
+        child.smash()
+    original = board.create_copy()
+    goals = [BlobGoal(COLOUR_LIST[0]), PerimeterGoal(COLOUR_LIST[1])]
+
+    for players, depth in ((goals[:1], 1), (goals[:1], 2), (goals, 2)):
+        player = SearchPlayer(0, players, 60.0, depth)
+        player._proceed = True
+        state = random.getstate()
+        move = player.generate_move(board)
+        assert random.getstate() == state
+        assert board == original
+        assert player.depth_reached == depth
+        best = _reference_value(board, players, 0, 0, depth, [0] * 2)
+        assert _reference_move(board, players, 0, 0, depth, [0] * 2,
+                               move) == best
+
+    player = SearchPlayer(1, goals, 0.0)
+    player._proceed = True
+    assert player.generate_move(board)[0] == 'pass'
+    assert player.depth_reached == 0
+    assert board == original
+
+
+def test_monte_carlo_player() -> None:
+    random.seed(8)
+    board = generate_board(4, 750)
+    original = board.create_copy()
+    goals = [PerimeterGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])]
+    moves = []
+    for _ in range(2):
+        player = MonteCarloPlayer(1, goals, 200)
+        player._proceed = True
+        state = random.getstate()
+        moves.append(player.generate_move(board))
+        assert random.getstate() == state
+        assert board == original
+        assert player.iterations_per_second > 0
+    assert moves[0] == moves[1]
+
+    player = MonteCarloPlayer(0, goals, None, 0.0)
+    player._proceed = True
+    assert player.generate_move(board)[0] == 'pass'
+
+    # Painting or combining is the only way to raise the perimeter score
+    board = Block((0, 0), 750, None, 0, 1)
+    board.smash()
+    for child in board.children:
+        child.colour = COLOUR_LIST[0]
+    board.children[3].colour = COLOUR_LIST[1]
+    player = MonteCarloPlayer(0, goals[:1], 500, None, 0)
+    player._proceed = True
+    move = player.generate_move(board)
+    assert move[0] in ('paint', 'combine')
+
+
+def test_encode_board() -> None:
+    random.seed(3)
+    for depth in range(0, 6):
+        board = generate_board(depth, 750)
+        data = board.encode()
+        assert decode_board(data) == board
+        leaves = sum(1 for block in _blocks(board) if not block.children)
+        bits = len(_blocks(board)) + 2 * leaves
+        assert len(data) == 14 + (bits + 7) // 8
+        for block in _blocks(board):
+            assert board.descendant(board.path_to(block)) is block
+
+
+def test_smart_player_parallel() -> None:
+    random.seed(4)
+    board = generate_board(4, 750)
+    original = board.create_copy()
+    results = []
+    for workers in (1, 3):
+        player = SmartPlayer(0, BlobGoal(COLOUR_LIST[1]), 30, False, workers)
+        random.seed(11)
+        moves = list(legal_moves(board, COLOUR_LIST[1]))
+        lst = [random.choice(moves) for _ in range(30)]
+        score = player._score_parallel(board, lst)
+        for move, value in zip(lst, score):
+            if move[0] != 'smash':
+                snapshot, copy = board.snapshot(move[2])
+                copy.perform((move[0], move[1]), COLOUR_LIST[1])
+                assert player.goal.score(snapshot) == value
+        random.seed(11)
+        player._proceed = True
+        results.append((score, player.generate_move(board)))
+        player.close()
+        assert board == original
+    assert results[0] == results[1]
+
+
+def test_simulate() -> None:
+    results = []
+    for _ in range(2):
+        goals = [BlobGoal(COLOUR_LIST[0]), PerimeterGoal(COLOUR_LIST[3])]
+        players = [RandomPlayer(0, goals[0]), SmartPlayer(1, goals[1], 5)]
+        results.append(simulate(3, players, 6, 42))
+    assert results[0] == results[1]
+
+    scores, log = results[0]
+    assert [score[0] for score in scores] == [0, 1]
+    assert [entry[0] for entry in log] == [0, 1] * 6
+    smashes = sum(1 for entry in log if entry[0] == 0 and entry[1] == SMASH)
+    paints = sum(1 for entry in log if entry[0] == 0 and entry[1] == PAINT)
+    combines = sum(1 for entry in log if entry[0] == 0 and entry[1] == COMBINE)
+    assert scores[0][2] == smashes * ACTION_PENALTY[SMASH] + \
+        paints * ACTION_PENALTY[PAINT] + combines * ACTION_PENALTY[COMBINE]
+
+    # Worker processes are stopped at the end of the game
+    player = SmartPlayer(1, goals[1], 5, False, 2)
+    simulate(2, [RandomPlayer(0, goals[0]), player], 2, 1)
+    assert player._pool is None
+
+
+def test_tournament(tmp_path) -> None:
+    results = run_tournament(['random', 'smart:3', 'mcts:5'], 2, 2, 3, 2)
+    assert len(results) == 6
+    assert [seed for seed, _ in results] == [0, 1] * 3
+    assert results[0][1] == play_game(2, ['random', 'smart:3'], 3, 0)
+    assert [seat[0] for seat in results[1][1]] == ['smart:3', 'random']
+
+    rates = win_rates(results)
+    assert {kind: rates[kind][0] for kind in rates} == \
+        {'random': 4, 'smart:3': 4, 'mcts:5': 4}
+    assert sum(played * rate for played, rate in rates.values()) == \
+        pytest.approx(6)
+
+    path = str(tmp_path / 'results.csv')
+    write_results(path, results)
+    with open(path) as file:
+        lines = file.read().splitlines()
+    assert lines[0] == 'seed,player0,score0,penalty0,moves0,' \
+                       'player1,score1,penalty1,moves1'
+    assert len(lines) == 7
+
+    for kind in ('smart', 'smart:-3', 'search:0', 'mcts:0', 'mcts:x',
+                 'random:1', 'greedy:3'):
+        with pytest.raises(ValueError):
+            create_player(kind, 0, generate_goals(1))
+
+    # A game between players with no time limit can be played again
+    assert play_game(2, ['search:1', 'mcts:5'], 2, 7) == \
+        play_game(2, ['search:1', 'mcts:5'], 2, 7)
+    with pytest.raises(SystemExit):
+        tournament_main(['random', 'smart:3', '--depth', '1'])
+
+
+def test_engine_without_pygame() -> None:
+    code = 'import sys, block, goal, actions, player, blocky, simulation; ' \
+           'print("pygame" in sys.modules)'
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.stdout.strip() == 'False'
+
+    from actions import ACTION_KEY, KEY_ACTION
+    assert KEY_ACTION[ACTION_KEY[SMASH]] == SMASH
+    assert KEY_ACTION[pygame.K_TAB] == PASS
+
+
+def _board_pixels(renderer: Renderer) -> bytes:
+    area = renderer._screen.subsurface((0, 0, 750, 750))
+    return pygame.image.tostring(area, 'RGB')
+
+
+def test_draw_blocks(renderer) -> None:
+    random.seed(16)
+    board = generate_board(5, 750)
+    renderer.draw_blocks(board)
+    for _ in range(30):
+        move = random.choice(list(legal_moves(board, COLOUR_LIST[0])))
+        move[2].perform((move[0], move[1]), COLOUR_LIST[0])
+        renderer.highlight_block(move[2].position, move[2].size)
+        renderer.draw_blocks(board, False)
+        renderer.draw_blocks(board)
+        drawn = _board_pixels(renderer)
+        # A board that was not drawn before is drawn all at once
+        renderer.draw_blocks(board.create_copy())
+        assert _board_pixels(renderer) == drawn
+        renderer.draw_blocks(board)
+        assert _board_pixels(renderer) == drawn
+
+    change = board.children[0].perform(ROTATE_CLOCKWISE)
+    assert renderer._dirty.take(board, 64) == [(375, 0, 375, 375)]
+    change.undo()
+
+
+def test_draw_board_tiles(renderer) -> None:
+    random.seed(17)
+    board = generate_board(4, 750)
+    squares = _block_to_squares(board)
+    renderer.draw_board(squares)
+    drawn = _board_pixels(renderer)
+    for colour, pos, size in squares:
+        rect = (pos[0], pos[1], size, size)
+        pygame.draw.rect(renderer._screen, colour, rect, 0)
+        pygame.draw.rect(renderer._screen, (0, 0, 0), rect, 3)
+    assert _board_pixels(renderer) == drawn
+    assert set(renderer._tiles) == {(colour, size, size)
+                                    for colour, _, size in squares}
+
+
+def test_draw_image_cache(renderer) -> None:
+    for _ in range(30):
+        renderer.draw_image(ROTATE_CLOCKWISE, (0, 0), 375)
+    assert (renderer.image_misses, renderer.image_hits) == (1, 29)
+
+    renderer.draw_image(SMASH, (0, 0), 188)
+    for size in range(1, 40):
+        renderer.draw_image(PASS, (0, 0), size)
+    assert len(renderer._scaled) == 32
+    assert (SMASH, 188) not in renderer._scaled
+    renderer.draw_image(ROTATE_CLOCKWISE, (0, 0), 375)
+    assert renderer.image_misses == 42
+
+
+def test_cell_geometry() -> None:
+    for origin, size in ((0, 750), (20, 100), (3, 7)):
+        for depth in range(MAX_DEPTH + 1):
+            starts = [cell_start(origin, size, depth, cell)
+                      for cell in range(2 ** depth + 1)]
+            assert starts[0] == origin and starts[-1] == origin + size
+            assert all(0 <= b - a <= -(-size // 2 ** depth)
+                       for a, b in zip(starts, starts[1:]))
+            for pixel in range(origin - 1, origin + size + 1):
+                cell = cell_at(origin, size, depth, pixel)
+                if 0 <= cell < 2 ** depth:
+                    assert starts[cell] <= pixel < starts[cell + 1]
+                else:
+                    assert pixel < origin or pixel >= origin + size
+    board = generate_board(3, 750)
+    assert board.cell_of((749, 0), 3) == (7, 0)
+    assert board.children[0].cell_of((749, 0), 3) == (7, 0)
+    assert board.children[1].cell_of((749, 0), 3) is None
+    assert board.cell_of((750, 0), 1) is None
+
+
+def test_block_index() -> None:
+    random.seed(19)
+    board = generate_board(5, 750)
+    index = _BlockIndex(board)
+    board.add_observer(index)
+    points = [(x, y) for x in range(0, 751, 47) for y in range(0, 751, 47)]
+    points += [(374, 375), (375, 374), (187, 188), (562, 563), (749, 0),
+               (749, 749), (163, 164), (164, 163)]
+    for turn in range(12):
+        for point in points:
+            for level in range(6):
+                block = _get_block(board, point, level)
+                assert index.get_block(point, level) is block
+                if block is not None:
+                    column, row = block.cell
+                    assert cell_start(0, 750, block.level, column) <= \
+                        point[0] < cell_start(0, 750, block.level, column + 1)
+                    assert cell_start(0, 750, block.level, row) <= \
+                        point[1] < cell_start(0, 750, block.level, row + 1)
+                    assert block.level == level or \
+                        block.level < level and not block.children
+        for _ in range(turn):
+            move = random.choice(list(legal_moves(board, COLOUR_LIST[0])))
+            move[2].perform((move[0], move[1]), COLOUR_LIST[0])
+    for point in ((750, 10), (-1, 10), (10, 750)):
+        assert _get_block(board, point, 3) is None
+        assert index.get_block(point, 3) is None
+
+
+def test_board_file() -> None:
+    random.seed(20)
+    boards = [generate_board(depth, 750) for depth in (0, 1, 3, 5, 2)]
+    boards.append(Block((10, 20), 300, COLOUR_LIST[3], 0, 4))
+    file = io.BytesIO()
+    assert write_boards(file, iter(boards)) == len(boards)
+    file.seek(0)
+    read = read_boards(file)
+    for board in boards:
+        assert next(read) == board
+    assert list(read) == []
+
+    data = file.getvalue()
+    for end in (2, len(data) - 1):
+        with pytest.raises(ValueError):
+            list(read_boards(io.BytesIO(data[:end])))
+
+
+def test_decode_truncated() -> None:
+    random.seed(20)
+    data = generate_board(4, 750).encode()
+    for end in (0, 5, 14, len(data) // 2, len(data) - 1):
+        with pytest.raises(ValueError, match='truncated'):
+            decode_board(data[:end])
+    # A Block below the deepest level cannot have children
+    leaf = Block((0, 0), 750, COLOUR_LIST[0], 0, 0).encode()
+    with pytest.raises(ValueError, match='corrupt'):
+        decode_board(leaf[:-1] + bytes([0x80]))
+
+
+def test_generate_board_seeded() -> None:
+    for depth in (0, 1, 4, 7):
+        board = generate_board(depth, 750, random.Random(148))
+        assert board == generate_board(depth, 750, random.Random(148))
+        assert board.max_depth == depth
+        assert all(block.level <= depth for block in _blocks(board))
+        assert board.create_copy() == board
+    # The global random state is neither used nor changed
+    random.seed(5)
+    state = random.getstate()
+    first = generate_board(5, 750, random.Random(0))
+    assert random.getstate() == state
+    assert first != generate_board(5, 750, random.Random(1))
+    # The whole board is subdivided, and every level can appear
+    boards = [generate_board(4, 750, random.Random(seed))
+              for seed in range(50)]
+    assert all(len(board.children) == 4 for board in boards)
+    assert {block.level for board in boards for block in _blocks(board)} == \
+        {0, 1, 2, 3, 4}
+
+
+def test_large_board() -> None:
+    board = generate_board(MAX_DEPTH, 750, random.Random(10))
+    goals = [BlobGoal(colour) for colour in COLOUR_LIST] + \
+        [PerimeterGoal(colour) for colour in COLOUR_LIST]
+    for goal in goals:
+        goal.score(board)
+    deepest = board
+    while any(child.children for child in deepest.children):
+        deepest = max(deepest.children, key=lambda b: len(_blocks(b)))
+    # Moves that change the whole board, a quarter of it, and a few cells
+    for block in (board, board.children[2], deepest):
+        assert block.rotate(1)
+        assert block.swap(0)
+        fresh = decode_board(board.encode())
+        assert [goal.score(board) for goal in goals] == \
+            [goal.score(fresh) for goal in goals]
+    cells = 2 ** MAX_DEPTH
+    assert sum(PerimeterGoal(colour).score(board)
+               for colour in COLOUR_LIST) == 4 * cells
+
+
 if __name__ == '__main__':
     pytest.main(['A2test.py'])
 
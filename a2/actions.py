@@ -20,8 +20,12 @@ Misha Schwartz, and Jaisie Sin
 === Module Description ===
 
 This file contains the different actions that can be made by a Player.
+
+The keys bound to the actions are in controls.py, which needs pygame.
+ACTION_KEY and KEY_ACTION can still be imported from here, and pygame is only
+loaded when they are.
 """
-import pygame
+from typing import Any
 
 # Actions that can be performed in the game
 ROTATE_CLOCKWISE = ('rotate', 1)
@@ -66,16 +70,12 @@ ACTION_PENALTY = {
     PASS: 0
 }
 
-ACTION_KEY = {
-    ROTATE_CLOCKWISE: pygame.K_d,
-    ROTATE_COUNTER_CLOCKWISE: pygame.K_a,
-    SWAP_HORIZONTAL: pygame.K_q,
-    SWAP_VERTICAL: pygame.K_e,
-    SMASH: pygame.K_SPACE,
-    COMBINE: pygame.K_c,
-    PAINT: pygame.K_r,
-    PASS: pygame.K_TAB
-}
 
-# Create a dictionary that is ACTION_KEY inverted
-KEY_ACTION = {value: key for key, value in ACTION_KEY.items()}
+def __getattr__(name: str) -> Any:
+    """Return the key bindings from controls.py when they are asked for, so
+    that pygame is only loaded when it is needed.
+    """
+    if name in ('ACTION_KEY', 'KEY_ACTION'):
+        import controls
+        return getattr(controls, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,821 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains benchmarks for the performance sensitive parts of the
+Blocky game. Run it directly to print the results of every benchmark.
+"""
+from __future__ import annotations
+from typing import Any, Callable, List, Optional, Tuple
+import gc
+import io
+import os
+import pickle
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import goal
+from block import Block, decode_board, generate_board, read_boards, \
+    write_boards
+from blocky import GameData
+from goal import BlobGoal, Goal, PerimeterGoal, _BlobIndex, _flatten, \
+    _flatten_array
+from player import MonteCarloPlayer, RandomPlayer, SearchPlayer, SmartPlayer, \
+    _BlockIndex, _get_block, legal_moves, random_move
+from settings import COLOUR_LIST, BOARD_SIZE, MAX_DEPTH
+from simulation import simulate
+
+
+def _seconds_per_call(function: Callable[[], Any], repeat: int) -> float:
+    """Return the average number of seconds that one call to <function>
+    takes, over <repeat> calls.
+
+    Like timeit, garbage collection is turned off while timing.
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return (time.perf_counter() - start) / repeat
+    finally:
+        gc.enable()
+
+
+def _recursive_blob_size(colour: Tuple[int, int, int], pos: Tuple[int, int],
+                         board: List[List[Tuple[int, int, int]]],
+                         visited: List[List[int]]) -> int:
+    """The recursive flood fill that BlobGoal used to score boards with."""
+    if len(board) > pos[0] >= 0 and len(board) > pos[1] >= 0 and \
+            visited[pos[0]][pos[1]] == -1:
+        if board[pos[0]][pos[1]] == colour:
+            visited[pos[0]][pos[1]] = 1
+            size = 1
+            for i in range(-1, 2):
+                size += _recursive_blob_size(colour, (i + pos[0], pos[1]),
+                                             board, visited)
+            for w in range(-1, 2):
+                size += _recursive_blob_size(colour, (pos[0], w + pos[1]),
+                                             board, visited)
+            return size
+        else:
+            visited[pos[0]][pos[1]] = 0
+    return 0
+
+
+def _recursive_blob_score(colour: Tuple[int, int, int], board: Block) -> int:
+    """Score <board> for a blob goal of <colour> the way BlobGoal used to."""
+    flattened = _flatten(board)
+    visited = [[-1] * len(flattened) for _ in range(len(flattened))]
+    score = [0]
+    for i in range(len(flattened)):
+        for j in range(len(flattened)):
+            if visited[i][j] == -1:
+                score.append(_recursive_blob_size(colour, (i, j), flattened,
+                                                  visited))
+    return max(score)
+
+
+def _stack_blob_scores(board: Block) -> List[int]:
+    """Score <board> for a blob goal of every colour, labelling the blobs of
+    every colour at once like BlobGoal.score does.
+    """
+    index = _BlobIndex(board)
+    return [index.largest(c) for c in COLOUR_LIST]
+
+
+def benchmark_blob_score() -> None:
+    """Compare scoring a blob goal with the recursive flood fill against the
+    explicit-stack labelling behind BlobGoal.score, on random boards and on
+    single-colour boards.
+    """
+    print('=== BlobGoal.score: recursive vs. explicit stack ===')
+    print(f'{"board":>16} {"recursive (ms)":>15} {"stack (ms)":>11} '
+          f'{"speedup":>8}')
+    random.seed(2020)
+    boards = []
+    for depth in range(3, 7):
+        boards.append((f'random d={depth}', generate_board(depth, BOARD_SIZE)))
+    for depth in (6, 8, 10):
+        boards.append((f'solid d={depth}',
+                       Block((0, 0), BOARD_SIZE, COLOUR_LIST[0], 0, depth)))
+
+    array_mode = goal.ARRAY_MODE
+    goal.ARRAY_MODE = False
+    for name, board in boards:
+        repeat = max(1, 4 ** (7 - board.max_depth))
+        new = _seconds_per_call(lambda: _stack_blob_scores(board), repeat)
+        try:
+            old = _seconds_per_call(
+                lambda: [_recursive_blob_score(c, board) for c in COLOUR_LIST],
+                repeat)
+        except RecursionError:
+            print(f'{name:>16} {"RecursionError":>15} {new * 1000:>11.2f}')
+            continue
+        print(f'{name:>16} {old * 1000:>15.2f} {new * 1000:>11.2f} '
+              f'{old / new:>7.1f}x')
+    goal.ARRAY_MODE = array_mode
+
+
+def benchmark_array_mode() -> None:
+    """Compare flattening boards and labelling their blobs with lists of
+    colours against NumPy arrays of colour indices.
+    """
+    print('=== Flattening and labelling: lists vs. NumPy arrays ===')
+    print(f'{"depth":>5} {"flatten (ms)":>13} {"array (ms)":>11} '
+          f'{"blobs (ms)":>11} {"array (ms)":>11}')
+    random.seed(2020)
+    array_mode = goal.ARRAY_MODE
+    for depth in range(3, 9):
+        board = generate_board(depth, BOARD_SIZE)
+        repeat = max(1, 4 ** (7 - depth))
+        results = []
+        for mode in (False, True):
+            goal.ARRAY_MODE = mode
+            # Flatten without the cache, since it would make every call but
+            # the first free
+            if mode:
+                flatten = _seconds_per_call(
+                    lambda: _flatten_array(board.create_copy()), repeat)
+            else:
+                flatten = _seconds_per_call(
+                    lambda: _flatten(board.create_copy()), repeat)
+            results.append(flatten)
+            results.append(_seconds_per_call(
+                lambda: _BlobIndex(board.create_copy()), repeat))
+        goal.ARRAY_MODE = array_mode
+        print(f'{depth:>5} {results[0] * 1000:>13.2f} '
+              f'{results[2] * 1000:>11.2f} {results[1] * 1000:>11.2f} '
+              f'{results[3] * 1000:>11.2f}')
+
+
+def _smash_fully(block: Block) -> None:
+    """Smash <block> and all of its descendants down to max_depth."""
+    block.smash()
+    for child in block.children:
+        _smash_fully(child)
+
+
+def _count_blocks(block: Block) -> int:
+    """Return the number of Blocks in the tree rooted at <block>."""
+    return 1 + sum(_count_blocks(child) for child in block.children)
+
+
+class _DictBlock:
+    """A Block laid out the way Block was before it used __slots__: every
+    instance has a __dict__ and stores its own position, which swap and rotate
+    rewrite for every descendant.
+    """
+    position: Tuple[int, int]
+    size: int
+    colour: Optional[Tuple[int, int, int]]
+    level: int
+    max_depth: int
+    children: List[_DictBlock]
+
+    def __init__(self, position: Tuple[int, int], size: int,
+                 colour: Optional[Tuple[int, int, int]], level: int,
+                 max_depth: int) -> None:
+        self.position = position
+        self.size = size
+        self.colour = colour
+        self.level = level
+        self.max_depth = max_depth
+        self.children = []
+        self._parent = None
+        self._observers = []
+        self._cache = None
+
+    def _update_children_positions(self, position: Tuple[int, int]) -> None:
+        self.position = position
+        if len(self.children) > 0:
+            size = round(self.size / 2.0)
+            x, y = position
+            lst = [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
+            for i in range(4):
+                self.children[i]._parent = self
+                self.children[i]._update_children_positions(lst[i])
+
+    def rotate(self) -> None:
+        self.children = self.children[1:] + self.children[:1]
+        self._update_children_positions(self.position)
+
+    def create_copy(self) -> _DictBlock:
+        a = _DictBlock(self.position, self.size, self.colour, self.level,
+                       self.max_depth)
+        for item in self.children:
+            child = item.create_copy()
+            child._parent = a
+            a.children.append(child)
+        return a
+
+
+def _to_dict_block(block: Block) -> _DictBlock:
+    """Return a _DictBlock tree with the same shape and colours as <block>."""
+    a = _DictBlock(block.position, block.size, block.colour, block.level,
+                   block.max_depth)
+    a.children = [_to_dict_block(child) for child in block.children]
+    return a
+
+
+def _bytes_allocated(function: Callable[[], Any]) -> int:
+    """Return the number of bytes still allocated by <function> once it
+    returns, counting the object it returns.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def benchmark_block_memory() -> None:
+    """Compare the memory used by each Block, and the time taken by
+    create_copy and by rotating the root, against the old Block layout on
+    fully smashed boards.
+    """
+    print('=== Block: __dict__ vs. __slots__ ===')
+    print(f'{"depth":>5} {"nodes":>7} {"bytes/node":>11} {"slots":>6} '
+          f'{"copy (ms)":>10} {"slots":>7} {"rotate (ms)":>12} {"slots":>7}')
+    random.seed(2020)
+    for depth in range(4, 9):
+        board = Block((0, 0), BOARD_SIZE, COLOUR_LIST[0], 0, depth)
+        _smash_fully(board)
+        old_board = _to_dict_block(board)
+        nodes = _count_blocks(board)
+        repeat = max(5, 4 ** (6 - depth))
+
+        old_bytes = _bytes_allocated(old_board.create_copy) / nodes
+        new_bytes = _bytes_allocated(board.create_copy) / nodes
+        old_copy = _seconds_per_call(old_board.create_copy, repeat)
+        new_copy = _seconds_per_call(board.create_copy, repeat)
+        old_rotate = _seconds_per_call(old_board.rotate, repeat)
+        new_rotate = _seconds_per_call(lambda: board.rotate(1), repeat)
+        print(f'{depth:>5} {nodes:>7} {old_bytes:>11.0f} {new_bytes:>6.0f} '
+              f'{old_copy * 1000:>10.2f} {new_copy * 1000:>7.2f} '
+              f'{old_rotate * 1000:>12.3f} {new_rotate * 1000:>7.3f}')
+
+
+def benchmark_snapshot() -> None:
+    """Compare trying a move on a create_copy of the board against trying it
+    on a snapshot, on fully smashed boards.
+    """
+    print('=== Trying a move: create_copy vs. snapshot ===')
+    print(f'{"depth":>5} {"copy (ms)":>10} {"snapshot (ms)":>14} '
+          f'{"new blocks":>11}')
+    random.seed(2020)
+    for depth in range(3, 8):
+        board = Block((0, 0), BOARD_SIZE, COLOUR_LIST[0], 0, depth)
+        _smash_fully(board)
+        block = board
+        while len(block.children) == 4 and block.level < depth - 1:
+            block = block.children[random.randint(0, 3)]
+
+        def by_copy() -> None:
+            board.create_copy()
+
+        def by_snapshot() -> None:
+            _, copy = board.snapshot(block)
+            copy.rotate(1)
+
+        repeat = max(5, 4 ** (6 - depth))
+        old = _seconds_per_call(by_copy, repeat)
+        new = _seconds_per_call(by_snapshot, repeat)
+        snapshot = board.snapshot(block)[0]
+        shared = {id(b) for b in _all_blocks(board)}
+        created = sum(1 for b in _all_blocks(snapshot) if id(b) not in shared)
+        print(f'{depth:>5} {old * 1000:>10.3f} {new * 1000:>14.3f} '
+              f'{created:>11}')
+
+
+def _all_blocks(block: Block) -> List[Block]:
+    """Return every Block in the tree rooted at <block>."""
+    result = [block]
+    for child in block.children:
+        result.extend(_all_blocks(child))
+    return result
+
+
+def benchmark_random_player() -> None:
+    """Report the microseconds RandomPlayer takes to pick a move, by listing
+    every valid move and choosing one, and with random_move, after each of a
+    run of random moves.
+    """
+    print('=== RandomPlayer: microseconds per move ===')
+    print(f'{"depth":>5} {"moves":>6} {"list":>9} {"random_move":>12}')
+    for depth in range(4, MAX_DEPTH + 1, 2):
+        board = generate_board(depth, BOARD_SIZE, random.Random(depth))
+        moves = len(list(legal_moves(board, COLOUR_LIST[0])))
+
+        def listed() -> None:
+            move = random.choice(list(legal_moves(board, COLOUR_LIST[0])))
+            move[2].perform((move[0], move[1]), COLOUR_LIST[0])
+
+        def drawn() -> None:
+            move = random_move(board, COLOUR_LIST[0])
+            move[2].perform((move[0], move[1]), COLOUR_LIST[0])
+        random.seed(depth)
+        before = _seconds_per_call(listed, 50)
+        random.seed(depth)
+        after = _seconds_per_call(drawn, 50)
+        print(f'{depth:>5} {moves:>6} {before * 1e6:>9.0f} '
+              f'{after * 1e6:>12.0f}')
+
+
+def benchmark_smart_player() -> None:
+    """Report the moves scored per second by SmartPlayer, picking 100 random
+    moves and in exhaustive mode, for both kinds of goal, and the number of
+    moves pruned instead of scored in exhaustive mode.
+    """
+    print('=== SmartPlayer: moves scored per second ===')
+    print(f'{"depth":>5} {"goal":>13} {"moves":>6} {"random":>9} '
+          f'{"exhaustive":>11} {"pruned":>7}')
+    random.seed(2020)
+    for depth in range(3, 7):
+        board = generate_board(depth, BOARD_SIZE)
+        for goal_type in (PerimeterGoal, BlobGoal):
+            rates = []
+            for exhaustive in (False, True):
+                player = SmartPlayer(0, goal_type(COLOUR_LIST[0]), 100,
+                                     exhaustive)
+                player._proceed = True
+                player.generate_move(board)
+                rates.append(player.moves_per_second)
+            moves = len(list(legal_moves(board, COLOUR_LIST[0])))
+            print(f'{depth:>5} {goal_type.__name__:>13} {moves:>6} '
+                  f'{rates[0]:>9.0f} {rates[1]:>11.0f} '
+                  f'{player.moves_pruned:>7}')
+
+
+def benchmark_search_player() -> None:
+    """Report how many turns SearchPlayer looks ahead in a two player game,
+    and how long it takes to choose a move, for a few time budgets.
+    """
+    print('=== SearchPlayer: turns looked ahead within a budget ===')
+    print(f'{"depth":>5} {"budget (s)":>11} {"turns":>6} {"taken (s)":>10}')
+    random.seed(2020)
+    goals = [BlobGoal(COLOUR_LIST[0]), PerimeterGoal(COLOUR_LIST[1])]
+    for depth in range(2, 6):
+        board = generate_board(depth, BOARD_SIZE)
+        for budget in (0.1, 0.5, 2.0):
+            player = SearchPlayer(0, goals, budget, 10)
+            player._proceed = True
+            start = time.perf_counter()
+            player.generate_move(board)
+            taken = time.perf_counter() - start
+            print(f'{depth:>5} {budget:>11.1f} {player.depth_reached:>6} '
+                  f'{taken:>10.3f}')
+
+
+def benchmark_monte_carlo_player() -> None:
+    """Report the iterations per second of MonteCarloPlayer in a two player
+    game, for a few rollout lengths.
+    """
+    print('=== MonteCarloPlayer: iterations per second ===')
+    print(f'{"depth":>5} {"rollout":>8} {"iterations/s":>13}')
+    random.seed(2020)
+    goals = [BlobGoal(COLOUR_LIST[0]), PerimeterGoal(COLOUR_LIST[1])]
+    for depth in range(2, 7):
+        board = generate_board(depth, BOARD_SIZE)
+        for rollout_turns in (0, 4, 8):
+            player = MonteCarloPlayer(0, goals, None, 500, rollout_turns)
+            player._proceed = True
+            player.generate_move(board)
+            print(f'{depth:>5} {rollout_turns:>8} '
+                  f'{player.iterations_per_second:>13.0f}')
+
+
+def benchmark_parallel_smart_player() -> None:
+    """Report the moves scored per second by a SmartPlayer picking 400 random
+    moves, scoring them in this process and with 1, 2, 4 and 8 workers.
+
+    The workers are started before timing, as they would be after the first
+    move of a game.
+    """
+    print('=== SmartPlayer: moves scored per second by workers ===')
+    print(f'{"depth":>5} {"workers":>8} {"moves/s":>9}')
+    random.seed(2020)
+    for depth in (5, 6):
+        board = generate_board(depth, BOARD_SIZE)
+        for workers in (None, 1, 2, 4, 8):
+            player = SmartPlayer(0, BlobGoal(COLOUR_LIST[0]), 400, False,
+                                 workers)
+            for _ in range(2):
+                player._proceed = True
+                player.generate_move(board)
+            player.close()
+            name = 'none' if workers is None else workers
+            print(f'{depth:>5} {name:>8} {player.moves_per_second:>9.0f}')
+
+
+def benchmark_simulate() -> None:
+    """Report the number of 10 turn games per second that simulate plays
+    between a RandomPlayer and a SmartPlayer of difficulty 5.
+    """
+    print('=== simulate: games per second ===')
+    print(f'{"depth":>5} {"games/s":>9}')
+    for depth in range(2, 6):
+        games = 20
+        start = time.perf_counter()
+        for seed in range(games):
+            players = [RandomPlayer(0, BlobGoal(COLOUR_LIST[0])),
+                       SmartPlayer(1, PerimeterGoal(COLOUR_LIST[1]), 5)]
+            simulate(depth, players, 10, seed)
+        rate = games / (time.perf_counter() - start)
+        print(f'{depth:>5} {rate:>9.1f}')
+
+
+def _import_cost(modules: str) -> Tuple[float, int]:
+    """Return the seconds taken to import <modules>, a comma separated list,
+    in a new Python process, and the KiB by which that raised the peak memory
+    of the process.
+
+    The peak is read from /proc/self/status in the new process, since the
+    peak that getrusage reports carries over from the process that started
+    it. So this only works on Linux.
+    """
+    code = 'import time\n' \
+           'def kib(field):\n' \
+           '    for line in open("/proc/self/status"):\n' \
+           '        if line.startswith(field + ":"):\n' \
+           '            return int(line.split()[1])\n' \
+           'before = kib("VmHWM")\n' \
+           'start = time.perf_counter()\n' \
+           f'import {modules}\n' \
+           'print(time.perf_counter() - start, kib("VmHWM") - before)'
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    seconds, memory = output.stdout.split()[-2:]
+    return float(seconds), int(memory)
+
+
+def benchmark_import_time() -> None:
+    """Report the time and the memory taken to import the engine modules,
+    which do not load pygame, and the whole game, which does.
+    """
+    print('=== import time of the engine and the game ===')
+    print(f'{"modules":>8} {"import (ms)":>12} {"memory (KiB)":>13}')
+    for name, modules in (('engine', 'block, goal, player, blocky'),
+                          ('pygame', 'pygame'),
+                          ('game', 'block, goal, player, blocky, game')):
+        runs = [_import_cost(modules) for _ in range(5)]
+        seconds = min(run[0] for run in runs)
+        memory = min(run[1] for run in runs)
+        print(f'{name:>8} {seconds * 1000:>12.1f} {memory:>13}')
+
+
+def benchmark_rendering() -> None:
+    """Report the time to render a frame of the main game state by redrawing
+    every Block, as the game used to, and by drawing only what changed, both
+    when idle and after a move.
+    """
+    import pygame
+    from blocky import _block_to_squares
+    from renderer import Renderer
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    renderer = Renderer(BOARD_SIZE)
+
+    print('=== rendering: milliseconds per frame ===')
+    print(f'{"depth":>5} {"leaves":>7} {"redraw all":>11} {"idle":>9} '
+          f'{"after move":>11}')
+    random.seed(2020)
+    for depth in (3, 4, 5, 6):
+        board = generate_board(depth, BOARD_SIZE)
+        _smash_fully(board)
+
+        def redraw() -> None:
+            renderer.clear()
+            renderer.draw_board(_block_to_squares(board))
+            renderer.draw_status('status')
+
+        def idle() -> None:
+            renderer.draw_blocks(board)
+            renderer.highlight_block((0, 0), board.size // 2)
+            renderer.draw_status('status')
+
+        moves = list(legal_moves(board, COLOUR_LIST[0]))
+
+        def after_move() -> None:
+            move = random.choice(moves)
+            change = move[2].perform((move[0], move[1]), COLOUR_LIST[0])
+            idle()
+            change.undo()
+
+        full = _seconds_per_call(redraw, 20)
+        renderer.draw_blocks(board)
+        quiet = _seconds_per_call(idle, 20)
+        moved = _seconds_per_call(after_move, 20)
+        print(f'{depth:>5} {4 ** depth:>7} {full * 1000:>11.2f} '
+              f'{quiet * 1000:>9.2f} {moved * 1000:>11.2f}')
+    pygame.quit()
+
+
+def _reference_board() -> Block:
+    """Return the 16x16 reference board from example_tests.py."""
+    board = Block((0, 0), BOARD_SIZE, None, 0, 2)
+    for colour in (None, COLOUR_LIST[2], COLOUR_LIST[1], COLOUR_LIST[3]):
+        board.children.append(Block(None, round(board.size / 2), colour, 1,
+                                    2))
+    top_right = board.children[0]
+    for colour in (COLOUR_LIST[0], COLOUR_LIST[1], COLOUR_LIST[1],
+                   COLOUR_LIST[3]):
+        top_right.children.append(Block(None, round(top_right.size / 2),
+                                        colour, 2, 2))
+    # A copy has its children linked to their parents, so they have positions
+    return board.create_copy()
+
+
+def benchmark_draw_board() -> None:
+    """Report the time for Renderer.draw_board to draw every square, with a
+    fill and an outline rect for each, as it used to, and by blitting tiles
+    drawn once, on the reference board and a fully smashed depth-6 board.
+    """
+    import pygame
+    from blocky import _block_to_squares
+    from renderer import Renderer
+    from settings import OUTLINE_COLOUR, OUTLINE_THICKNESS
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    renderer = Renderer(BOARD_SIZE)
+    screen = pygame.display.get_surface()
+
+    def draw_rects(squares: List[Tuple[Tuple[int, int, int], Tuple[int, int],
+                                       int]]) -> None:
+        for colour, pos, size in squares:
+            rect = (pos[0], pos[1], size, size)
+            pygame.draw.rect(screen, colour, rect, 0)
+            pygame.draw.rect(screen, OUTLINE_COLOUR, rect, OUTLINE_THICKNESS)
+
+    print('=== draw_board: milliseconds per frame ===')
+    print(f'{"board":>9} {"squares":>8} {"rects":>8} {"tiles":>8}')
+    random.seed(2020)
+    smashed = generate_board(6, BOARD_SIZE)
+    _smash_fully(smashed)
+    for name, board in (('16x16', _reference_board()),
+                        ('depth 6', smashed)):
+        squares = _block_to_squares(board)
+        rects = _seconds_per_call(lambda: draw_rects(squares), 20)
+        tiles = _seconds_per_call(lambda: renderer.draw_board(squares), 20)
+        print(f'{name:>9} {len(squares):>8} {rects * 1000:>8.2f} '
+              f'{tiles * 1000:>8.2f}')
+    pygame.quit()
+
+
+def benchmark_draw_image() -> None:
+    """Report the time for Renderer.draw_image to draw an action image,
+    scaling it every time as it used to and with the cache of scaled images.
+    """
+    import pygame
+    from actions import ROTATE_CLOCKWISE
+    from renderer import Renderer
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    renderer = Renderer(BOARD_SIZE)
+    screen = pygame.display.get_surface()
+    image = renderer._images[ROTATE_CLOCKWISE]
+
+    def scale_every_time(size: int) -> None:
+        screen.blit(pygame.transform.scale(image, (size, size)), (0, 0))
+
+    print('=== draw_image: milliseconds per frame ===')
+    print(f'{"size":>5} {"scaled":>8} {"cached":>8}')
+    for size in (750, 375, 94, 12):
+        scaled = _seconds_per_call(lambda: scale_every_time(size), 30)
+        cached = _seconds_per_call(
+            lambda: renderer.draw_image(ROTATE_CLOCKWISE, (0, 0), size), 30)
+        print(f'{size:>5} {scaled * 1000:>8.3f} {cached * 1000:>8.3f}')
+    print(f'hits: {renderer.image_hits}, misses: {renderer.image_misses}')
+    pygame.quit()
+
+
+def _recursive_get_block(block: Block, location: Tuple[int, int],
+                         level: int) -> Optional[Block]:
+    """The _get_block that tried every child in turn, and went down the
+    child it found the Block in a second time to return it.
+    """
+    if len(block.children) == 0 and level >= block.level or \
+            len(block.children) == 4 and level == block.level:
+        if block.position[0] <= location[0] < block.position[0] + block.size \
+                and block.position[1] <= location[1] < block.position[1] + \
+                block.size:
+            return block
+        else:
+            return None
+    else:
+        for i in range(0, 4):
+            if _recursive_get_block(block.children[i], location,
+                                    level) is not None:
+                return _recursive_get_block(block.children[i], location,
+                                            level)
+        return None
+
+
+def benchmark_get_block() -> None:
+    """Report the time to find the Block at a location, by trying every child
+    as _get_block used to, by going straight down to the right child, and
+    with an index of the Blocks kept up to date with the board.
+    """
+    print('=== _get_block: microseconds per lookup ===')
+    print(f'{"depth":>5} {"recursive":>10} {"direct":>8} {"index":>8}')
+    random.seed(2020)
+    for depth in range(2, 7):
+        board = generate_board(depth, BOARD_SIZE)
+        _smash_fully(board)
+        index = _BlockIndex(board)
+        board.add_observer(index)
+        points = [(random.randrange(BOARD_SIZE), random.randrange(BOARD_SIZE))
+                  for _ in range(200)]
+
+        def lookups(find: Callable[[Tuple[int, int]], Optional[Block]]) \
+                -> None:
+            for point in points:
+                find(point)
+
+        times = [_seconds_per_call(lambda: lookups(find), 5) / len(points)
+                 for find in (lambda p: _recursive_get_block(board, p, depth),
+                              lambda p: _get_block(board, p, depth),
+                              lambda p: index.get_block(p, depth))]
+        print(f'{depth:>5} {times[0] * 1e6:>10.1f} {times[1] * 1e6:>8.2f} '
+              f'{times[2] * 1e6:>8.2f}')
+
+
+def benchmark_encoding() -> None:
+    """Report the size of a board written by str, pickled, and encoded by
+    Block.encode, and the time to encode and decode it, for random boards.
+    """
+    print('=== board encoding: bytes per board and milliseconds ===')
+    print(f'{"depth":>5} {"blocks":>7} {"str":>9} {"pickle":>9} '
+          f'{"encoded":>8} {"encode":>7} {"decode":>7}')
+    random.seed(2020)
+    for depth in range(2, 9):
+        board = generate_board(depth, BOARD_SIZE)
+        data = board.encode()
+        encode = _seconds_per_call(board.encode, 5)
+        decode = _seconds_per_call(lambda: decode_board(data), 5)
+        print(f'{depth:>5} {_count_blocks(board):>7} '
+              f'{len(str(board).encode()):>9} '
+              f'{len(pickle.dumps(board.create_copy())):>9} {len(data):>8} '
+              f'{encode * 1000:>7.2f} {decode * 1000:>7.2f}')
+
+    boards = [generate_board(5, BOARD_SIZE) for _ in range(1000)]
+    file = io.BytesIO()
+    start = time.perf_counter()
+    write_boards(file, boards)
+    written = time.perf_counter() - start
+    file.seek(0)
+    start = time.perf_counter()
+    count = sum(1 for _ in read_boards(file))
+    read = time.perf_counter() - start
+    print(f'{count} depth 5 boards in {len(file.getvalue())} bytes: '
+          f'{count / written:.0f} written/s, {count / read:.0f} read/s')
+
+
+def benchmark_generate_board() -> None:
+    """Report how many random boards per second are made by each depth, with
+    the random module, and with a seeded random.Random drawing each level at
+    once.
+    """
+    print('=== generate_board: boards per second ===')
+    print(f'{"depth":>5} {"blocks":>7} {"random":>9} {"seeded":>9}')
+    for depth in range(1, 10):
+        random.seed(depth)
+        count = sum(_count_blocks(generate_board(depth, BOARD_SIZE))
+                    for _ in range(20)) // 20
+        repeat = max(3, 2000 // count)
+        plain = _seconds_per_call(lambda: generate_board(depth, BOARD_SIZE),
+                                  repeat)
+        rng = random.Random(depth)
+        seeded = _seconds_per_call(
+            lambda: generate_board(depth, BOARD_SIZE, rng), repeat)
+        print(f'{depth:>5} {count:>7} {1 / plain:>9.0f} {1 / seeded:>9.0f}')
+
+
+def _score(board: Block, goals: List[Goal]) -> None:
+    """Score <board> for each of <goals>."""
+    for g in goals:
+        g.score(board)
+
+
+def _move_and_score(block: Block, board: Block, goals: List[Goal]) -> None:
+    """Rotate <block> of <board> clockwise and score <board> for <goals>."""
+    block.rotate(1)
+    _score(board, goals)
+
+
+def benchmark_large_boards() -> None:
+    """Report the milliseconds taken to generate a random board, score it the
+    first time, and make a move on it and score it again, by depth up to
+    MAX_DEPTH.
+
+    A large move rotates the whole board, and a small move rotates one of the
+    deepest Blocks that has children. Both goals are scored after each move.
+    """
+    print('=== large boards: milliseconds by depth ===')
+    print(f'{"depth":>5} {"cells":>9} {"blocks":>6} {"generate":>8} '
+          f'{"score":>7} {"large":>7} {"small":>7}')
+    goals = [BlobGoal(COLOUR_LIST[0]), PerimeterGoal(COLOUR_LIST[0])]
+    for depth in range(2, MAX_DEPTH + 1):
+        rng = random.Random(depth)
+        generate = _seconds_per_call(
+            lambda: generate_board(depth, BOARD_SIZE, rng), 5)
+        board = generate_board(depth, BOARD_SIZE, rng)
+        copies = [decode_board(board.encode()) for _ in range(3)]
+        score = _seconds_per_call(lambda: _score(copies.pop(), goals), 3)
+
+        deepest = board
+        while any(child.children for child in deepest.children):
+            deepest = max(deepest.children, key=_count_blocks)
+        _score(board, goals)
+        large = _seconds_per_call(
+            lambda: _move_and_score(board, board, goals), 4)
+        small = _seconds_per_call(
+            lambda: _move_and_score(deepest, board, goals), 4)
+        side = 2 ** depth
+        print(f'{depth:>5} {f"{side}x{side}":>9} {_count_blocks(board):>6} '
+              f'{generate * 1000:>8.2f} {score * 1000:>7.2f} '
+              f'{large * 1000:>7.2f} {small * 1000:>7.2f}')
+
+
+def benchmark_scoreboard() -> None:
+    """Report the milliseconds taken to rotate a board and score it for four
+    players, by depth: one player at a time with GameData.calculate_score,
+    and all of them at once with GameData.scoreboard. Rotating it and scoring
+    it for one player is shown for comparison.
+
+    Two players have a BlobGoal and two a PerimeterGoal, each for a different
+    colour.
+    """
+    print('=== scoreboard: milliseconds to move and score 4 players ===')
+    print(f'{"depth":>5} {"1 player":>9} {"per player":>11} '
+          f'{"scoreboard":>11}')
+    goals = [BlobGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1]),
+             PerimeterGoal(COLOUR_LIST[2]), PerimeterGoal(COLOUR_LIST[3])]
+    players = [RandomPlayer(i, g) for i, g in enumerate(goals)]
+    for depth in range(4, MAX_DEPTH + 1, 2):
+        board = generate_board(depth, BOARD_SIZE, random.Random(depth))
+        data = GameData(board, players)
+        data.scoreboard()
+
+        def one_player() -> None:
+            board.rotate(1)
+            data.calculate_score(0)
+
+        def per_player() -> None:
+            board.rotate(1)
+            for player in players:
+                data.calculate_score(player.id)
+
+        def scoreboard() -> None:
+            board.rotate(1)
+            data.scoreboard()
+        times = [_seconds_per_call(f, 8) * 1000
+                 for f in (one_player, per_player, scoreboard)]
+        print(f'{depth:>5} {times[0]:>9.2f} {times[1]:>11.2f} '
+              f'{times[2]:>11.2f}')
+
+
+if __name__ == '__main__':
+    benchmark_import_time()
+    benchmark_blob_score()
+    benchmark_array_mode()
+    benchmark_block_memory()
+    benchmark_snapshot()
+    benchmark_random_player()
+    benchmark_smart_player()
+    benchmark_parallel_smart_player()
+    benchmark_search_player()
+    benchmark_monte_carlo_player()
+    benchmark_simulate()
+    benchmark_rendering()
+    benchmark_draw_board()
+    benchmark_draw_image()
+    benchmark_get_block()
+    benchmark_encoding()
+    benchmark_generate_board()
+    benchmark_large_boards()
+    benchmark_scoreboard()
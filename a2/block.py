@@ -22,17 +22,76 @@ Misha Schwartz, and Jaisie Sin
 This file contains the Block class, the main data structure used in the game.
 """
 from __future__ import annotations
-from typing import Optional, Tuple, List
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, \
+    Optional, Tuple, List
 import random
 import math
+import struct
 
 from settings import colour_name, COLOUR_LIST
 
+# The offset, in child-sized steps, of each child from its parent's upper left
+# corner. The order matches the order of Block.children.
+CHILD_OFFSETS = [(1, 0), (0, 0), (0, 1), (1, 1)]
 
-def generate_board(max_depth: int, size: int) -> Block:
+# An encoded Block starts with its x, y, size, level and max_depth, followed by
+# a bit for each Block of the tree in preorder: _PARENT for a Block with
+# children, or _LEAF followed by the index of its colour in COLOUR_LIST as two
+# bits. The bits are packed into bytes, first bit first, and the last byte is
+# padded with zeros.
+_HEADER = struct.Struct('>iiiBB')
+_PARENT = '1'
+_LEAF = '0'
+_COLOUR_BITS = {colour: _LEAF + format(i, '02b')
+                for i, colour in enumerate(COLOUR_LIST)}
+# Encoded boards in a file are each preceded by their length in bytes
+_LENGTH = struct.Struct('>I')
+
+
+def cell_start(origin: int, size: int, depth: int, cell: int) -> int:
+    """Return the pixel at which column or row <cell> starts, among the
+    2 ** <depth> columns or rows that a Block at pixel <origin> with <size>
+    pixels is split into <depth> levels below it.
+
+    Cell c starts at floor(c * size / 2 ** depth + 1/2), worked out in
+    integers, so the cells at every depth cover the Block exactly: none of
+    them overlap and there are no gaps between them. Each cell starts where
+    the first of its four children does.
+
+    >>> [cell_start(0, 750, 2, cell) for cell in range(5)]
+    [0, 188, 375, 563, 750]
+    >>> cell_start(10, 750, 3, 6) == cell_start(10, 750, 2, 3)
+    True
+    """
+    return origin + ((cell * size << 1) + (1 << depth) >> (depth + 1))
+
+
+def cell_at(origin: int, size: int, depth: int, pixel: int) -> int:
+    """Return the column or row, among the 2 ** <depth> columns or rows that a
+    Block at pixel <origin> with <size> pixels is split into <depth> levels
+    below it, that <pixel> is in.
+
+    This is the cell c with cell_start(origin, size, depth, c) <= <pixel> <
+    cell_start(origin, size, depth, c + 1). It is negative or at least
+    2 ** <depth> if <pixel> is outside the Block.
+
+    >>> [cell_at(0, 750, 2, pixel) for pixel in (0, 187, 188, 562, 563, 749)]
+    [0, 0, 1, 2, 3, 3]
+    >>> cell_at(0, 750, 2, -1), cell_at(0, 750, 2, 750)
+    (-1, 4)
+    """
+    return ((2 * (pixel - origin) + 1 << depth) - 1) // (2 * size)
+
+
+def generate_board(max_depth: int, size: int,
+                   rng: Optional[random.Random] = None) -> Block:
     """Return a new game board with a depth of <max_depth> and dimensions of
     <size> by <size>.
 
+    If <rng> is given, the board is made from its random numbers alone, so
+    the same seed, <max_depth> and <size> always make the same board, no matter
+    which process makes it. Otherwise the random module is used.
+
     >>> board = generate_board(3, 750)
     >>> board.max_depth
     3
@@ -40,13 +99,141 @@ def generate_board(max_depth: int, size: int) -> Block:
     750
     >>> len(board.children) == 4
     True
+    >>> generate_board(5, 750, random.Random(1)) == \\
+    ...     generate_board(5, 750, random.Random(1))
+    True
     """
+    if rng is not None:
+        return _generate_in_bulk(max_depth, size, rng)
+
     board = Block((0, 0), size, random.choice(COLOUR_LIST), 0, max_depth)
     board.smash()
 
     return board
 
 
+def _generate_in_bulk(max_depth: int, size: int, rng: random.Random) -> Block:
+    """Return a new game board with a depth of <max_depth> and dimensions of
+    <size> by <size>, using random numbers from <rng>.
+
+    The board is made one level at a time. The colours of all the children at
+    a level, and whether each of them is smashed, are drawn from <rng> at
+    once. As in Block.smash, the child of a Block at level L is smashed with a
+    probability of exp(-0.25 * L).
+    """
+    # Each colour is drawn as two random bits, so there must be four colours
+    assert len(COLOUR_LIST) == 4
+    board = Block((0, 0), size, COLOUR_LIST[rng.getrandbits(2)], 0,
+                  max_depth)
+    parents = [board] if max_depth > 0 else []
+    level = 0
+    while parents:
+        count = len(parents)
+        # One byte holds the colours of the four children of a parent
+        colours = rng.getrandbits(8 * count).to_bytes(count, 'little')
+        smash = None
+        if level + 1 < max_depth:
+            # Whether a child is smashed is decided by a 16 bit number
+            threshold = round(math.exp(-0.25 * level) * 65536)
+            draws = struct.unpack(f'<{4 * count}H', rng.getrandbits(
+                64 * count).to_bytes(8 * count, 'little'))
+            smash = [draw < threshold for draw in draws]
+
+        children = []
+        child_size = cell_start(0, size, level + 1, 1)
+        for i in range(count):
+            parent = parents[i]
+            parent._colour = None
+            byte = colours[i]
+            for j in range(4):
+                child = Block(None, child_size,
+                              COLOUR_LIST[(byte >> (2 * j)) & 3], level + 1,
+                              max_depth)
+                child._parent = parent
+                parent._children.append(child)
+                if smash is not None and smash[4 * i + j]:
+                    children.append(child)
+        parents = children
+        level += 1
+    return board
+
+
+def decode_board(data: bytes) -> Block:
+    """Return the Block that was encoded as <data> by Block.encode.
+
+    Raise ValueError if <data> is cut short, or does not encode a Block.
+
+    >>> board = generate_board(3, 750)
+    >>> decode_board(board.encode()) == board
+    True
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError('truncated board encoding')
+    x, y, size, level, max_depth = _HEADER.unpack_from(data)
+    body = data[_HEADER.size:]
+    bits = format(int.from_bytes(body, 'big'), f'0{len(body) * 8}b')
+    try:
+        return _decode(iter(bits), (x, y), size, level, max_depth)
+    except StopIteration:
+        raise ValueError('truncated board encoding') from None
+
+
+def _decode(bits: Iterator[str], position: Optional[Tuple[int, int]],
+            size: int, level: int, max_depth: int) -> Block:
+    """Return the Block encoded by the next bits taken from <bits>.
+
+    Raise StopIteration if <bits> runs out first, and ValueError if a Block at
+    <max_depth> is encoded as having children.
+    """
+    block = Block(position, size, None, level, max_depth)
+    if next(bits) == _PARENT:
+        if level >= max_depth:
+            raise ValueError('corrupt board encoding')
+        for _ in range(4):
+            child = _decode(bits, None, block._child_size(), level + 1,
+                            max_depth)
+            child._parent = block
+            block._children.append(child)
+    else:
+        block._colour = COLOUR_LIST[int(next(bits) + next(bits), 2)]
+    return block
+
+
+def write_boards(file: BinaryIO, boards: Iterable[Block]) -> int:
+    """Write each of <boards> to <file>, which is open for writing bytes, and
+    return the number of boards written.
+
+    Each board is encoded by Block.encode, so the file can be read back one
+    board at a time by read_boards.
+    """
+    count = 0
+    for board in boards:
+        data = board.encode()
+        file.write(_LENGTH.pack(len(data)))
+        file.write(data)
+        count += 1
+    return count
+
+
+def read_boards(file: BinaryIO) -> Iterator[Block]:
+    """Yield each board written to <file> by write_boards, in order, reading
+    only one board at a time from <file>.
+
+    Raise ValueError if <file> ends part of the way through a board.
+    """
+    while True:
+        prefix = file.read(_LENGTH.size)
+        if len(prefix) == 0:
+            return
+        if len(prefix) < _LENGTH.size:
+            raise ValueError('truncated board encoding')
+        (length,) = _LENGTH.unpack(prefix)
+        data = file.read(length)
+        if len(data) < length:
+            raise ValueError('truncated board encoding')
+        yield decode_board(data)
+
+
 class Block:
     """A square Block in the Blocky game, represented as a tree.
 
@@ -55,15 +242,29 @@ class Block:
     describe the upper left corner (x, y), and the origin is at (0, 0). All
     positions and sizes are in the unit of pixels.
 
+    Only the Block at the top of a tree stores its position and size. Every
+    other Block is identified by its level and its cell: the column and row
+    it is in among the Blocks that could be at its level. Its position and
+    size are worked out from those when asked for, by cell_start, so swap and
+    rotate do not need to visit the descendants of a Block. A Block's size is
+    the same as that of every other Block at its level, but since the cells
+    at a level cover the board exactly, the cell a Block covers on the screen
+    may be a pixel smaller than its size.
+
     When a block has four children, the order of its children impacts each
     child's position. Indices 0, 1, 2, and 3 are the upper-right child,
     upper-left child, lower-left child, and lower-right child, respectively.
 
+    Blocks use __slots__ to keep large boards small.
+
     === Public Attributes ===
     position:
         The (x, y) coordinates of the upper left corner of this Block.
     size:
         The height and width of this square Block.
+    cell:
+        The (column, row) of this Block among the Blocks that could be at its
+        level, counted from the top of its tree.
     colour:
         If this block is not subdivided, <colour> stores its colour. Otherwise,
         <colour> is None.
@@ -79,11 +280,17 @@ class Block:
         stored in this order: upper-right child, upper-left child,
         lower-left child, lower-right child.
 
+    Setting <colour> or <children> clears the values cached from this Block
+    and its ancestors, like the methods that change a Block do. Changing the
+    list of children in place does not, except to fill in a list that was
+    just set, such as an empty one, before this Block is next scored.
+
     === Representation Invariants===
     - len(children) == 0 or len(children) == 4
     - If this Block has children:
         - their max_depth is the same as that of this Block.
-        - their size is half that of this Block.
+        - their size is half that of the Block at the top of the tree, rounded
+          to the nearest pixel, for each level they are below it.
         - their level is one greater than that of this Block.
         - their position is determined by the position and size of this Block,
           and their index in this Block's list of children.
@@ -92,12 +299,46 @@ class Block:
         - its colour is not None.
     - level <= max_depth
     """
+    # === Private Attributes ===
+    # _position:
+    #   The position this Block was given, which is its position as long as
+    #   it is not linked to a parent.
+    # _size:
+    #   The size this Block was given, which is its size as long as it is not
+    #   linked to a parent.
+    # _colour:
+    #   The colour of this Block, changed without clearing the cached values
+    #   by the methods that change this Block and then call _changed.
+    # _children:
+    #   The children of this Block, changed like _colour.
+    # _parent:
+    #   The Block that has this Block as a child, or None if this Block is
+    #   the root of its tree (or was attached to its parent by hand).
+    # _observers:
+    #   Objects that are told about every change to the unit cells covered
+    #   by this Block through their block_changed method, or None if there
+    #   are none.
+    # _cache:
+    #   Values worked out from this Block and its descendants by cached, by
+    #   key, or None if there are none. It is cleared whenever this Block or
+    #   one of its descendants changes.
     position: Tuple[int, int]
     size: int
+    cell: Tuple[int, int]
     colour: Optional[Tuple[int, int, int]]
     level: int
     max_depth: int
     children: List[Block]
+    _position: Optional[Tuple[int, int]]
+    _size: int
+    _colour: Optional[Tuple[int, int, int]]
+    _children: List[Block]
+    _parent: Optional[Block]
+    _observers: Optional[List[Any]]
+    _cache: Optional[Dict[str, Any]]
+
+    __slots__ = ('_position', '_size', '_colour', 'level', 'max_depth',
+                 '_children', '_parent', '_observers', '_cache')
 
     def __init__(self, position: Tuple[int, int], size: int,
                  colour: Optional[Tuple[int, int, int]], level: int,
@@ -111,12 +352,130 @@ class Block:
             - level >= 0
             - max_depth >= level
         """
-        self.position = position
-        self.size = size
-        self.colour = colour
+        self._position = position
+        self._size = size
+        self._colour = colour
         self.level = level
         self.max_depth = max_depth
-        self.children = []
+        self._children = []
+        self._parent = None
+        self._observers = None
+        self._cache = None
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """The (x, y) coordinates of the upper left corner of this Block."""
+        top, depth, column, row = self._locate()
+        if depth == 0:
+            return self._position
+        x, y = top._position
+        return (cell_start(x, top._size, depth, column),
+                cell_start(y, top._size, depth, row))
+
+    @position.setter
+    def position(self, position: Tuple[int, int]) -> None:
+        """Move this Block, which must not be linked to a parent, to
+        <position>.
+        """
+        self._position = position
+
+    @property
+    def size(self) -> int:
+        """The height and width of this square Block."""
+        top, depth, _, _ = self._locate()
+        return cell_start(0, top._size, depth, 1)
+
+    @size.setter
+    def size(self, size: int) -> None:
+        """Resize this Block, which must not be linked to a parent, to
+        <size>.
+        """
+        self._size = size
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this Block if it is not subdivided, or None."""
+        return self._colour
+
+    @colour.setter
+    def colour(self, colour: Optional[Tuple[int, int, int]]) -> None:
+        """Give this Block <colour>, as a change to this Block."""
+        self._colour = colour
+        self._changed()
+
+    @property
+    def children(self) -> List[Block]:
+        """The blocks into which this block is subdivided."""
+        return self._children
+
+    @children.setter
+    def children(self, children: List[Block]) -> None:
+        """Give this Block <children>, as a change to this Block.
+
+        The list may be filled in after it is set, as long as this Block is
+        not scored in between. Any other change to the list in place is not
+        noticed.
+        """
+        self._children = children
+        self._changed()
+
+    @property
+    def cell(self) -> Tuple[int, int]:
+        """The (column, row) of this Block among the Blocks that could be at
+        its level, counted from the top of its tree.
+        """
+        _, _, column, row = self._locate()
+        return column, row
+
+    def cell_of(self, location: Tuple[int, int], level: int) \
+            -> Optional[Tuple[int, int]]:
+        """Return the (column, row), counted like Block.cell, of the cell at
+        <level> that <location> is in, or None if <location> is not in this
+        Block.
+
+        Preconditions:
+            - self.level <= level
+        """
+        top, depth, column, row = self._locate()
+        x, y = top._position
+        shift = level - self.level
+        depth += shift
+        cell = (cell_at(x, top._size, depth, location[0]),
+                cell_at(y, top._size, depth, location[1]))
+        if cell[0] >> shift != column or cell[1] >> shift != row:
+            return None
+        return cell
+
+    def _locate(self) -> Tuple[Block, int, int, int]:
+        """Return the Block at the top of the tree this Block is linked into,
+        the number of levels this Block is below it, and the column and row of
+        this Block at its level.
+
+        Each level below the top adds one bit to the column and the row: the
+        offset of the child taken at that level (see CHILD_OFFSETS).
+        """
+        block = self
+        depth = column = row = 0
+        while True:
+            index = block._index_in_parent()
+            if index == -1:
+                return block, depth, column, row
+            column |= CHILD_OFFSETS[index][0] << depth
+            row |= CHILD_OFFSETS[index][1] << depth
+            depth += 1
+            block = block._parent
+
+    def _index_in_parent(self) -> int:
+        """Return the index of this Block among the children of its parent, or
+        -1 if it is not linked to a parent.
+        """
+        parent = self._parent
+        if parent is not None:
+            children = parent._children
+            for index in range(len(children)):
+                if children[index] is self:
+                    return index
+        return -1
 
     def __str__(self) -> str:
         """Return this Block in a string format.
@@ -165,7 +524,8 @@ class Block:
 
     def _child_size(self) -> int:
         """Return the size of this Block's children."""
-        return round(self.size / 2.0)
+        top, depth, _, _ = self._locate()
+        return cell_start(0, top._size, depth + 1, 1)
 
     def _children_positions(self) -> List[Tuple[int, int]]:
         """Return the positions of this Block's four children.
@@ -173,24 +533,107 @@ class Block:
         The positions are returned in this order: upper-right child, upper-left
         child, lower-left child, lower-right child.
         """
-        x = self.position[0]
-        y = self.position[1]
-        size = self._child_size()
-
-        return [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
+        top, depth, column, row = self._locate()
+        x, y = top._position
+        size = top._size
+        return [(cell_start(x, size, depth + 1, 2 * column + offset[0]),
+                 cell_start(y, size, depth + 1, 2 * row + offset[1]))
+                for offset in CHILD_OFFSETS]
 
     def _update_children_positions(self, position: Tuple[int, int]) -> None:
-        """Set the position of this Block to <position> and update all its
-        descendants to have positions consistent with this Block's.
+        """Set the position of this Block to <position> and make all its
+        descendants have positions consistent with this Block's.
 
         <position> is the (x, y) coordinates of the upper-left corner of this
-        Block.
+        Block. Descendants work out their positions from their parents, so
+        this only has to link them.
         """
-        self.position = position
-        if len(self.children) > 0:
-            lst = self._children_positions()
-            for i in range(4):
-                self.children[i]._update_children_positions(lst[i])
+        if self._parent is None:
+            self._position = position
+        self._link()
+
+    def _link(self) -> None:
+        """Make every descendant of this Block refer back to its parent.
+
+        Blocks created by smash and create_copy are linked already; this is
+        for trees whose children were assigned by hand. A child that is
+        already linked is taken to have its own descendants linked, and is left
+        alone even if it is linked to another Block, since snapshots share
+        Blocks with the tree they were taken from.
+        """
+        for child in self.children:
+            if child._parent is None:
+                child._parent = self
+                child._link()
+
+    def add_observer(self, observer: Any) -> None:
+        """Tell <observer> about every future change to the unit cells covered
+        by this Block.
+
+        Whenever a smash, swap, rotate, paint or combine is performed on this
+        Block or one of its descendants, observer.block_changed(block, x, y) is
+        called with the Block that changed and the column and row of its upper
+        left unit cell, relative to this Block.
+        """
+        self._link()
+        if self._observers is None:
+            self._observers = []
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: Any) -> None:
+        """Stop telling <observer> about changes to this Block, if it was
+        being told.
+        """
+        if self._observers is not None and observer in self._observers:
+            self._observers.remove(observer)
+
+    def get_observer(self, kind: type) -> Any:
+        """Return the observer of this Block that is an instance of <kind>, or
+        None if there is no such observer.
+        """
+        for observer in self._observers or []:
+            if isinstance(observer, kind):
+                return observer
+        return None
+
+    def cached(self, key: str, compute: Callable[[Block], Any]) -> Any:
+        """Return compute(self), remembering the result under <key> until this
+        Block or one of its descendants changes.
+
+        <compute> must only depend on this Block and its descendants, and the
+        value it returns must not be mutated, since it is shared by every
+        caller and by copies of this Block.
+        """
+        if self._cache is None:
+            self._cache = {}
+        elif key in self._cache:
+            return self._cache[key]
+        # Make sure that a change to any descendant reaches this Block
+        self._link()
+        value = compute(self)
+        self._cache[key] = value
+        return value
+
+    def _changed(self) -> None:
+        """Clear the cached values of this Block and of all its ancestors, and
+        notify their observers that the unit cells covered by this Block have
+        changed.
+        """
+        x, y = 0, 0
+        block = self
+        while True:
+            block._cache = None
+            if block._observers is not None:
+                for observer in block._observers:
+                    observer.block_changed(self, x, y)
+            # Move the offset into the coordinates of the parent
+            index = block._index_in_parent()
+            if index == -1:
+                return
+            shift = block.max_depth - block.level
+            x |= CHILD_OFFSETS[index][0] << shift
+            y |= CHILD_OFFSETS[index][1] << shift
+            block = block._parent
 
     def smashable(self) -> bool:
         """Return True iff this block can be smashed.
@@ -211,23 +654,32 @@ class Block:
         """
         if not self.smashable():
             return False
-        lst = self._children_positions()
-        # rand is for choosing from the 4 different colours
+        self._subdivide()
+        self._changed()
+        return True
 
-        self.children = []
-        for i in range(4):
+    def _subdivide(self) -> None:
+        """Give this leaf four randomly coloured children, and randomly keep
+        subdividing them.
+        """
+        # rand is for choosing from the 4 different colours
+        # The children work out their positions from this Block, so they are
+        # not given one.
+        self._children = []
+        size = self._child_size()
+        for _ in range(4):
             rand = random.randint(0, 3)
-            self.children.append(Block(lst[i], self._child_size(),
-                                       COLOUR_LIST[rand], self.level + 1,
-                                       self.max_depth))
-        self.colour = None
+            child = Block(None, size, COLOUR_LIST[rand],
+                          self.level + 1, self.max_depth)
+            child._parent = self
+            self._children.append(child)
+        self._colour = None
         # runs only if children not max depth (4 time for 4 children)
         if self.level + 1 < self.max_depth:
             for i in range(4):
                 num = random.random()
                 if num < math.exp(-0.25 * self.level):
-                    self.children[i].smash()
-        return True
+                    self.children[i]._subdivide()
 
     def swap(self, direction: int) -> bool:
         """Swap the child Blocks of this Block.
@@ -256,6 +708,7 @@ class Block:
             self.children[1] = tmp
             self.children[2] = tmp1
         self._update_children_positions(self.position)
+        self._changed()
         return True
 
     def rotate(self, direction: int) -> bool:
@@ -283,17 +736,27 @@ class Block:
             self.children[2] = self.children[1]
             self.children[1] = temp
         self._update_children_positions(self.position)
+        self._changed()
         return True
 
+    def paintable(self, colour: Tuple[int, int, int]) -> bool:
+        """Return True iff this block can be painted with <colour>.
+
+        A block can be painted if it is a leaf at a level of max_depth and its
+        colour is different from <colour>.
+        """
+        return self.level == self.max_depth and self.colour != colour \
+            and len(self.children) == 0
+
     def paint(self, colour: Tuple[int, int, int]) -> bool:
         """Change this Block's colour iff it is a leaf at a level of max_depth
         and its colour is different from <colour>.
 
         Return True iff this Block's colour was changed.
         """
-        if self.level == self.max_depth and self.colour != colour \
-                and len(self.children) == 0:
-            self.colour = colour
+        if self.paintable(colour):
+            self._colour = colour
+            self._changed()
             return True
         return False
 
@@ -310,8 +773,28 @@ class Block:
 
         Return True iff this Block was turned into a leaf node.
         """
-        if self.level != self.max_depth - 1 or len(self.children) == 0:
+        colour = self._majority_colour()
+        if colour is None:
             return False
+        self._children = []
+        self._colour = colour
+        self._changed()
+        return True
+
+    def combinable(self) -> bool:
+        """Return True iff this block can be combined.
+
+        A block can be combined if it is at a level of max_depth - 1, has
+        children, and its children have a majority colour.
+        """
+        return self._majority_colour() is not None
+
+    def _majority_colour(self) -> Optional[Tuple[int, int, int]]:
+        """Return the majority colour of this Block's children, or None if this
+        Block cannot be combined.
+        """
+        if self.level != self.max_depth - 1 or len(self.children) == 0:
+            return None
         colour_tracker = {}
         for item in self.children:
             if item.colour in colour_tracker:
@@ -327,27 +810,223 @@ class Block:
             elif maxx > colour_tracker[item] >= second_max:
                 second_max = colour_tracker[item]
         if maxx == second_max:
-            return False
+            return None
         for item in colour_tracker:
             if colour_tracker[item] == maxx:
-                self.children = []
-                self.colour = item
-        return True
+                return item
+        return None
+
+    def perform(self, action: Tuple[str, Optional[int]],
+                colour: Optional[Tuple[int, int, int]] = None) \
+            -> Optional[BlockChange]:
+        """Do <action> to this Block and return a record of the change that can
+        undo it, or return None if <action> could not be done.
+
+        <action> is a (name, direction) pair such as ('rotate', 1), where name
+        is one of 'rotate', 'swap', 'smash', 'paint' and 'combine'. <colour> is
+        the colour to paint with.
+        """
+        name, direction = action
+        before = (self.colour, list(self.children))
+        if name == 'rotate':
+            done = self.rotate(direction)
+        elif name == 'swap':
+            done = self.swap(direction)
+        elif name == 'smash':
+            done = self.smash()
+        elif name == 'paint':
+            done = self.paint(colour)
+        elif name == 'combine':
+            done = self.combine()
+        else:
+            done = False
+
+        if not done:
+            return None
+        return BlockChange(self, action, before,
+                           (self.colour, list(self.children)))
+
+    def _restore(self, colour: Optional[Tuple[int, int, int]],
+                 children: List[Block]) -> None:
+        """Give this Block <colour> and <children>, which must have been its
+        colour and children at some point.
+        """
+        self._colour = colour
+        self._children = list(children)
+        self._changed()
 
     def create_copy(self) -> Block:
         """Return a new Block that is a deep copy of this Block.
 
         Remember that a deep copy has new blocks (not aliases) at every level.
+
+        Cached values are shared with the copy, and observers that can be
+        copied are copied along with the Block they observe, so that the copy
+        does not have to work them out again.
+        """
+        return self._copy_tree(self.position)
+
+    def snapshot(self, block: Block) -> Tuple[Block, Block]:
+        """Return a copy of this Block that can be changed at <block> without
+        changing this Block, along with the copy of <block>.
+
+        Only the Blocks on the path from this Block down to <block>, and the
+        children of <block>, are copied. Every other Block is shared with this
+        Block, so a snapshot takes a number of new Blocks proportional to the
+        depth of the tree rather than its size. As with create_copy, cached
+        values are shared and observers are copied.
+
+        A snapshot is meant for trying out a move on <block> and scoring the
+        result. Only the copy of <block> may be changed, and the positions of
+        the shared Blocks below it do not follow it if it is swapped or
+        rotated.
+
+        Precondition:
+            - <block> is this Block or one of its descendants, and is linked to
+              its ancestors
+        """
+        root = self._shallow_copy(self.position)
+        copy = root
+        for index in self.path_to(block):
+            child = copy.children[index]._shallow_copy(None)
+            child._parent = copy
+            copy.children[index] = child
+            copy = child
+        # Copy the children too, so that moving them in the snapshot does not
+        # change the Blocks they are shared with
+        for i in range(len(copy.children)):
+            child = copy.children[i]._shallow_copy(None)
+            child._parent = copy
+            copy.children[i] = child
+        return root, copy
+
+    def path_to(self, block: Block) -> List[int]:
+        """Return the indices of the children to go down, in order, to get
+        from this Block to <block>.
+
+        Precondition:
+            - <block> is this Block or one of its descendants
+        """
+        self._link()
+        path = []
+        node = block
+        while node is not self:
+            path.append(node._index_in_parent())
+            node = node._parent
+        path.reverse()
+        return path
+
+    def descendant(self, path: List[int]) -> Block:
+        """Return the Block reached by going down to the children at the
+        indices in <path>, in order, starting from this Block.
+        """
+        block = self
+        for index in path:
+            block = block._children[index]
+        return block
+
+    def encode(self) -> bytes:
+        """Return this Block and its descendants in a compact binary form,
+        which decode_board turns back into an equal Block.
+
+        The form takes one bit for each Block with children and three bits for
+        each leaf, after a header of 14 bytes. Cached values and observers are
+        not encoded.
         """
-        a = Block(self.position, self.size, self.colour, self.level,
-                  self.max_depth)
+        x, y = self.position
+        header = _HEADER.pack(x, y, self.size, self.level, self.max_depth)
+        bits = []
+        blocks = [self]
+        while blocks:
+            block = blocks.pop()
+            if len(block._children) == 4:
+                bits.append(_PARENT)
+                blocks.extend(reversed(block._children))
+            else:
+                bits.append(_COLOUR_BITS[block._colour])
+        bits = ''.join(bits)
+        length = (len(bits) + 7) // 8
+        # Converting a string of bits to an int takes linear time
+        body = int(bits, 2) << (length * 8 - len(bits))
+        return header + body.to_bytes(length, 'big')
 
-        if len(self.children) == 4:
-            a.colour = None
-            for item in self.children:
-                a.children.append(item.create_copy())
+    def _shallow_copy(self, position: Optional[Tuple[int, int]]) -> Block:
+        """Return a copy of this Block at <position> that shares its children
+        with this Block.
+
+        A copy at no position is to be linked to a parent, which gives it its
+        size, so it keeps the size this Block was given rather than working out
+        its size from its ancestors each time.
+        """
+        size = self._size if position is None else self.size
+        a = Block(position, size, self.colour, self.level, self.max_depth)
+        a._children = list(self._children)
+        if self._cache is not None:
+            a._cache = dict(self._cache)
+        if self._observers is not None:
+            a._observers = [observer.copy() for observer in self._observers
+                            if hasattr(observer, 'copy')]
         return a
 
+    def _copy_tree(self, position: Optional[Tuple[int, int]]) -> Block:
+        """Return a deep copy of this Block at <position>, whose descendants
+        are linked to their parents and so are not given positions.
+        """
+        a = self._shallow_copy(position)
+        a._children = []
+        if len(self._children) == 4:
+            a._colour = None
+            for item in self._children:
+                child = item._copy_tree(None)
+                child._parent = a
+                a._children.append(child)
+        return a
+
+
+class BlockChange:
+    """A change made to a Block by Block.perform, which can be undone and
+    redone.
+
+    Changes to a board must be undone in the reverse of the order they were
+    made in, and redone in the order they were made in. Undoing a smash keeps
+    the children it made, so redoing it brings back the very same children.
+
+    === Public Attributes ===
+    block:
+        The Block that was changed.
+    action:
+        The (name, direction) pair of the action that changed <block>.
+    """
+    # === Private Attributes ===
+    # _before:
+    #   The colour and children of <block> before the change.
+    # _after:
+    #   The colour and children of <block> after the change.
+    block: Block
+    action: Tuple[str, Optional[int]]
+    _before: Tuple[Optional[Tuple[int, int, int]], List[Block]]
+    _after: Tuple[Optional[Tuple[int, int, int]], List[Block]]
+
+    def __init__(self, block: Block, action: Tuple[str, Optional[int]],
+                 before: Tuple[Optional[Tuple[int, int, int]], List[Block]],
+                 after: Tuple[Optional[Tuple[int, int, int]], List[Block]]) \
+            -> None:
+        """Initialize this record of <action> changing <block> from the colour
+        and children in <before> to those in <after>.
+        """
+        self.block = block
+        self.action = action
+        self._before = before
+        self._after = after
+
+    def undo(self) -> None:
+        """Put <block> back the way it was before the change."""
+        self.block._restore(*self._before)
+
+    def redo(self) -> None:
+        """Make the change to <block> again, after it was undone."""
+        self.block._restore(*self._after)
+
 
 if __name__ == '__main__':
     import python_ta
@@ -355,7 +1034,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
-            'settings'
+            'settings', 'struct'
         ],
         'max-attributes': 15,
         'max-args': 6
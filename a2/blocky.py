@@ -23,17 +23,21 @@ This file contains the different game states for the Blocky game.
 """
 
 from __future__ import annotations
-from typing import Dict, List, Optional, Tuple
-import pygame
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+import time
 
-from actions import ACTION_MESSAGE, ROTATE_CLOCKWISE, \
-    ROTATE_COUNTER_CLOCKWISE, SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, \
-    PAINT, COMBINE, ACTION_PENALTY
-from block import Block
+from actions import ACTION_MESSAGE, SMASH, PASS, PAINT, COMBINE, \
+    ACTION_PENALTY
+from block import Block, BlockChange
+from goal import blob_sizes, score_goals
 from player import Player
-from renderer import Renderer
 from settings import ANIMATION_DURATION
 
+if TYPE_CHECKING:
+    # Only the game window draws and sends events, and it loads pygame itself
+    import pygame
+    from renderer import Renderer
+
 
 def _block_to_squares(board: Block) -> List[Tuple[Tuple[int, int, int],
                                                   Tuple[int, int], int]]:
@@ -117,12 +121,80 @@ class GameData:
         on the actions they've taken.
         """
         goal_score = self.players[player_id].goal.score(self.board)
+        return goal_score, self.calculate_penalty(player_id)
+
+    def calculate_penalty(self, player_id: int) -> int:
+        """Return the deductions from <player_id>'s score based on the actions
+        they've taken.
+        """
+        return self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
+            self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
+            self.paints[player_id] * ACTION_PENALTY[PAINT]
 
-        penalty = self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
-                  self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
-                  self.paints[player_id] * ACTION_PENALTY[PAINT]
+    def scoreboard(self) -> List[Tuple[int, int, int]]:
+        """Return the ID, goal score and penalty of every player, in the order
+        of <players>.
 
-        return goal_score, penalty
+        The goals of all the players are scored together by score_goals, so
+        the board is only looked at once for all of them.
+        """
+        scores = score_goals(self.board,
+                             [player.goal for player in self.players])
+        return [(player.id, score, self.calculate_penalty(player.id))
+                for player, score in zip(self.players, scores)]
+
+    def blob_sizes(self) -> Dict[Tuple[int, int, int], List[int]]:
+        """Return the sizes of the blobs of each colour on the board, from the
+        largest to the smallest.
+        """
+        return blob_sizes(self.board)
+
+    def apply(self, move: Tuple[str, Optional[int], Block], player_id: int) \
+            -> Optional[Tuple[int, Optional[BlockChange]]]:
+        """Do <move> for the player with <player_id>, counting it towards their
+        penalties, and return a record that can undo it.
+
+        The record is the player ID and the change made to the board, which is
+        None for a pass. Return None if <move> could not be done.
+        """
+        action = (move[0], move[1])
+        if action == PASS:
+            return player_id, None
+
+        change = move[2].perform(action, self.players[player_id].goal.colour)
+        if change is None:
+            return None
+        self._count(player_id, action, 1)
+        return player_id, change
+
+    def undo(self, record: Tuple[int, Optional[BlockChange]]) -> None:
+        """Undo the move recorded in <record> by apply, including its penalty.
+
+        Moves must be undone in the reverse of the order they were applied in.
+        """
+        player_id, change = record
+        if change is not None:
+            change.undo()
+            self._count(player_id, change.action, -1)
+
+    def redo(self, record: Tuple[int, Optional[BlockChange]]) -> None:
+        """Do the move recorded in <record> again, after it was undone."""
+        player_id, change = record
+        if change is not None:
+            change.redo()
+            self._count(player_id, change.action, 1)
+
+    def _count(self, player_id: int, action: Tuple[str, Optional[int]],
+               amount: int) -> None:
+        """Add <amount> to the number of times the player with <player_id> has
+        done <action>, if it is an action with a penalty.
+        """
+        if action == SMASH:
+            self.smashes[player_id] += amount
+        elif action == PAINT:
+            self.paints[player_id] += amount
+        elif action == COMBINE:
+            self.combines[player_id] += amount
 
 
 class GameState:
@@ -154,11 +226,15 @@ class MainState(GameState):
     #   A reference to the shared GameData.
     # _current_player_index:
     #   The index of the current player in GameData.players.
+    # _scores:
+    #   The ID, goal score and penalty of every player, from
+    #   GameData.scoreboard after the most recent move.
     # _current_score:
     #   The score of the current player, including penalties.
     _turn: int
     _data: GameData
     _current_player_index: int
+    _scores: List[Tuple[int, int, int]]
     _current_score: int
 
     def __init__(self, data: GameData) -> None:
@@ -167,7 +243,8 @@ class MainState(GameState):
         self._data = data
         self._current_player_index = 0
 
-        score, penalty = self._data.calculate_score(self._current_player().id)
+        self._scores = self._data.scoreboard()
+        _, score, penalty = self._scores[self._current_player_index]
         self._current_score = score - penalty
 
     def _current_player(self) -> Player:
@@ -179,7 +256,9 @@ class MainState(GameState):
         self._current_player_index = (self._current_player_index + 1) % len(
             self._data.players)
 
-        score, penalty = self._data.calculate_score(self._current_player().id)
+        # Every player is scored at once after each move
+        self._scores = self._data.scoreboard()
+        _, score, penalty = self._scores[self._current_player_index]
         self._current_score = score - penalty
 
         if self._current_player_index == 0:
@@ -187,28 +266,8 @@ class MainState(GameState):
 
     def _do_move(self, move: Tuple[str, Optional[int], Block]) -> bool:
         """Attempt to do the player's requested move."""
-        action = (move[0], move[1])
-        direction = move[1]
-        block = move[2]
         player = self._current_player()
-        move_successful = False
-
-        if action in [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE]:
-            move_successful = block.rotate(direction)
-        elif action in [SWAP_HORIZONTAL, SWAP_VERTICAL]:
-            move_successful = block.swap(direction)
-        elif action == SMASH:
-            move_successful = block.smash()
-            self._data.smashes[player.id] += int(move_successful)
-        elif action == PAINT:
-            move_successful = block.paint(self._current_player().goal.colour)
-            self._data.paints[player.id] += int(move_successful)
-        elif action == COMBINE:
-            move_successful = block.combine()
-            self._data.combines[player.id] += int(move_successful)
-        elif action == PASS:
-            # Do nothing
-            move_successful = True
+        move_successful = self._data.apply(move, player.id) is not None
 
         if move_successful:
             self._update_player()
@@ -231,22 +290,22 @@ class MainState(GameState):
             # No move was made, stay in the current state
             return self
         else:
-            # Save what the board looks like before the move
-            background = _block_to_squares(self._data.board)
-            # Also save the current player ID
+            # Save the current player ID
             player_id = self._current_player().id
 
             # Do the move
             if self._do_move(move):
-                # Animate the move that was just done
-                return AnimateMoveState(self, player_id, move, background)
+                # Animate the move that was just done, in front of the board as
+                # the renderer last drew it, which is from before the move
+                return AnimateMoveState(self, player_id, move,
+                                        self._data.board)
             else:
                 # The move was not valid, let the player try again
                 return self
 
     def render(self, renderer: Renderer) -> None:
         """Renders the board after a move is placed"""
-        renderer.draw_board(_block_to_squares(self._data.board))
+        renderer.draw_blocks(self._data.board)
 
         b = self._current_player().get_selected_block(self._data.board)
         if b is not None:
@@ -271,24 +330,24 @@ class AnimateMoveState(GameState):
     #   The move being animated.
     # _start_time:
     #   The time that the animation started.
-    # _background:
-    #   The board to display behind the animation.
+    # _board:
+    #   The board the move was made on. The renderer keeps showing it as it
+    #   was before the move until the animation is complete.
     _parent: GameState
     _player_id: int
     _move: Tuple[str, Optional[int], Block]
-    _start_time: int
-    _background: List[Tuple[Tuple[int, int, int], Tuple[int, int], int]]
+    _start_time: float
+    _board: Block
 
     def __init__(self, parent: GameState, player_id: int,
                  move: Tuple[str, Optional[int], Block],
-                 background: List[Tuple[Tuple[int, int, int], Tuple[int, int],
-                                        int]]) -> None:
+                 board: Block) -> None:
         """Initialize this GameState."""
         self._parent = parent
         self._player_id = player_id
         self._move = move
-        self._background = background
-        self._start_time = pygame.time.get_ticks()
+        self._board = board
+        self._start_time = time.perf_counter()
 
     def process_event(self, event: pygame.event.Event) -> None:
         """Processes the event for the player"""
@@ -296,7 +355,7 @@ class AnimateMoveState(GameState):
 
     def update(self) -> GameState:
         """Updates the game state after player places a move"""
-        elapsed_seconds = (pygame.time.get_ticks() - self._start_time) / 1000
+        elapsed_seconds = time.perf_counter() - self._start_time
 
         if elapsed_seconds > ANIMATION_DURATION:
             # The animation is complete, do the move, go back to the last
@@ -308,7 +367,7 @@ class AnimateMoveState(GameState):
 
     def render(self, renderer: Renderer) -> None:
         """Render the board after a move is placed"""
-        renderer.draw_board(self._background)
+        renderer.draw_blocks(self._board, False)
 
         # Draw an outline around the selected block
         b = self._move[2]
@@ -335,10 +394,7 @@ class GameOverState(GameState):
 
     def __init__(self, data: GameData) -> None:
         """Initialize this GameState."""
-        self._scores = []
-        for p in data.players:
-            goal_score, penalty = data.calculate_score(p.id)
-            self._scores.append((p.id, goal_score, penalty))
+        self._scores = data.scoreboard()
 
         self._winner = max(self._scores, key=lambda item: item[1] - item[2])[0]
 
@@ -354,6 +410,7 @@ class GameOverState(GameState):
 
     def render(self, renderer: Renderer) -> None:
         """Render the board after a move is placed"""
+        renderer.clear()
         x = 10
         y = 10
         for t in self._scores:
@@ -375,7 +432,8 @@ if __name__ == '__main__':
         'allowed-io': ['run_game'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'pygame', '__future__',
-            'block', 'player', 'renderer', 'settings', 'actions'
+            'block', 'goal', 'player', 'renderer', 'settings', 'actions',
+            'time'
         ],
         'generated-members': 'pygame.*'
     })
@@ -0,0 +1,96 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains the controls of the Blocky game: the keys bound to each
+action, and the translation of pygame events into what the players do.
+
+This is the only part of the game logic that needs pygame, so that the Blocky
+engine (blocks, goals, players and GameData) can be used without a display.
+"""
+from typing import Optional, Tuple
+import pygame
+
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, COMBINE, PAINT, PASS
+
+ACTION_KEY = {
+    ROTATE_CLOCKWISE: pygame.K_d,
+    ROTATE_COUNTER_CLOCKWISE: pygame.K_a,
+    SWAP_HORIZONTAL: pygame.K_q,
+    SWAP_VERTICAL: pygame.K_e,
+    SMASH: pygame.K_SPACE,
+    COMBINE: pygame.K_c,
+    PAINT: pygame.K_r,
+    PASS: pygame.K_TAB
+}
+
+# Create a dictionary that is ACTION_KEY inverted
+KEY_ACTION = {value: key for key, value in ACTION_KEY.items()}
+
+# The keys that move the selection up (towards the root) and down a level
+LEVEL_UP_KEY = pygame.K_w
+LEVEL_DOWN_KEY = pygame.K_s
+
+
+def is_proceed(event: pygame.event.Event) -> bool:
+    """Return True iff <event> tells a computer player to make its move, which
+    is a click of the left mouse button.
+    """
+    return event.type == pygame.MOUSEBUTTONDOWN and event.button == 1
+
+
+def key_action(event: pygame.event.Event) -> Optional[Tuple[str,
+                                                             Optional[int]]]:
+    """Return the action whose key was pressed in <event>, or None if
+    <event> is not the press of an action's key.
+    """
+    if event.type == pygame.KEYDOWN:
+        return KEY_ACTION.get(event.key)
+    return None
+
+
+def level_change(event: pygame.event.Event) -> int:
+    """Return -1 if <event> is the press of the key that selects the level
+    above, 1 if it is the press of the key that selects the level below, and
+    0 otherwise.
+    """
+    if event.type == pygame.KEYDOWN:
+        if event.key == LEVEL_UP_KEY:
+            return -1
+        elif event.key == LEVEL_DOWN_KEY:
+            return 1
+    return 0
+
+
+def mouse_position() -> Tuple[int, int]:
+    """Return the position of the mouse on the screen."""
+    return pygame.mouse.get_pos()
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', 'pygame', 'actions'
+        ],
+        'generated-members': 'pygame.*'
+    })
@@ -56,7 +56,7 @@ class Game:
         """Initialize this game, as described in the Assignment 2 handout.
 
         Precondition:
-            2 <= max_depth <= 5
+            2 <= max_depth <= MAX_DEPTH
         """
         board = generate_board(max_depth, BOARD_SIZE)
         players = create_players(num_human, num_random, smart_players)
@@ -69,6 +69,15 @@ class Game:
         """Start the main game loop and stop after num_turns.
         """
         self._data.max_turns = num_turns
+        try:
+            self._loop()
+        finally:
+            # Stop any worker processes the players started
+            for player in self._data.players:
+                player.close()
+
+    def _loop(self) -> None:
+        """Run the main game loop until the window is closed."""
         clock = pygame.time.Clock()
 
         while True:
@@ -84,12 +93,12 @@ class Game:
             # Update the state of the game
             self._state = self._state.update()
 
-            # Render the new state of the game
-            self._renderer.clear()
+            # Render the new state of the game. States only draw what they
+            # need to, so the screen is not cleared first.
             self._state.render(self._renderer)
 
-            # Update the screen
-            pygame.display.flip()
+            # Update the parts of the screen that were drawn on
+            self._renderer.update_display()
 
 
 def create_auto_game() -> Game:
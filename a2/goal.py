@@ -22,12 +22,45 @@ Misha Schwartz, and Jaisie Sin
 This file contains the hierarchy of Goal classes.
 """
 from __future__ import annotations
-import math
 import random
-from typing import List, Tuple
-from block import Block
+from typing import Any, Dict, List, Optional, Tuple
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, PAINT
+from block import Block, CHILD_OFFSETS
 from settings import colour_name, COLOUR_LIST
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# When True, boards are flattened into NumPy arrays of colour indices for
+# scoring. This needs NumPy, so it is off when NumPy is not installed.
+ARRAY_MODE = numpy is not None
+
+# The index of each colour in COLOUR_LIST
+_COLOUR_INDEX = {colour: i for i, colour in enumerate(COLOUR_LIST)}
+
+# For each action that reorders the children of a Block, the index of the
+# child that ends up at each index of Block.children
+_REORDERED = {
+    ROTATE_CLOCKWISE: (1, 2, 3, 0),
+    ROTATE_COUNTER_CLOCKWISE: (3, 0, 1, 2),
+    SWAP_HORIZONTAL: (1, 0, 3, 2),
+    SWAP_VERTICAL: (3, 2, 1, 0)
+}
+
+# The counts of the colours in a summary (see _summary) are packed into one
+# int, with this many bits for the count of each colour in COLOUR_LIST, so
+# that adding two packed ints adds up the counts of every colour at once
+_COUNT_BITS = 32
+_COUNT_MASK = (1 << _COUNT_BITS) - 1
+
+# In array mode, a _BlobIndex labels the whole board again, instead of only
+# the blobs around the changed Block, when the changed Block covers at least
+# one in this many of the unit cells of the board.
+_RELABEL_SHARE = 16
+
 
 def generate_goals(num_goals: int) -> List[Goal]:
     """Return a randomly generated list of goals with length num_goals.
@@ -63,6 +96,38 @@ def generate_goals(num_goals: int) -> List[Goal]:
     return lst
 
 
+def score_goals(board: Block, goals: List[Goal]) -> List[int]:
+    """Return the score of each of <goals> on <board>, in the same order.
+
+    The goals share the work of scoring: the edge counts of every colour are
+    added up once for all the PerimeterGoals, and the largest blob of every
+    colour is found once for all the BlobGoals.
+    """
+    shared = {}
+    return [goal.score_shared(board, shared) for goal in goals]
+
+
+def blob_sizes(board: Block) -> Dict[Tuple[int, int, int], List[int]]:
+    """Return the sizes of the blobs of each colour in COLOUR_LIST on
+    <board>, from the largest to the smallest.
+
+    The blobs are labelled by the same _BlobIndex that BlobGoal.score uses.
+    """
+    sizes = _blob_index(board).sizes()
+    return {colour: sizes.get(i, []) for i, colour in enumerate(COLOUR_LIST)}
+
+
+def _blob_index(board: Block) -> _BlobIndex:
+    """Return the _BlobIndex that observes <board>, starting one if there is
+    none yet.
+    """
+    index = board.get_observer(_BlobIndex)
+    if index is None:
+        index = _BlobIndex(board)
+        board.add_observer(index)
+    return index
+
+
 def _flatten(block: Block) -> List[List[Tuple[int, int, int]]]:
     """Return a two-dimensional list representing <block> as rows and columns of
     unit cells.
@@ -76,31 +141,548 @@ def _flatten(block: Block) -> List[List[Tuple[int, int, int]]]:
     of the block at the cell location[i][j]
 
     L[0][0] represents the unit cell in the upper left corner of the Block.
+
+    The result is cached on <block> and each of its descendants, so only the
+    Blocks changed since the last call are flattened again. It must not be
+    mutated.
     """
-    if block.level == block.max_depth:
-        return [[block.colour]]
-    elif len(block.children) == 0:
-        temp = []
-        unit = int(math.pow(2, (block.max_depth - block.level)))
-        for i in range(unit):
-            temp.append([block.colour] * unit)
-        return temp
-    else:
-        temp = []
-        top_left = _flatten(block.children[1])
-        bottom_left = _flatten(block.children[2])
-        top_right = _flatten(block.children[0])
-        bottom_right = _flatten(block.children[3])
-        for i in range(len(top_left)):
-            tup = top_left[i] + bottom_left[i]
-            temp.append(tup)
-        for i in range(len(top_right)):
-            tup = top_right[i] + bottom_right[i]
-            temp.append(tup)
+    return block.cached('flatten', _flatten_uncached)
+
 
+def _flatten_uncached(block: Block) -> List[List[Tuple[int, int, int]]]:
+    """Return _flatten(<block>), flattening the children of <block> through
+    their caches.
+    """
+    if len(block.children) == 0:
+        unit = 1 << (block.max_depth - block.level)
+        return [[block.colour] * unit for _ in range(unit)]
+
+    top_right, top_left, bottom_left, bottom_right = \
+        [_flatten(child) for child in block.children]
+    temp = []
+    for i in range(len(top_left)):
+        temp.append(top_left[i] + bottom_left[i])
+    for i in range(len(top_right)):
+        temp.append(top_right[i] + bottom_right[i])
     return temp
 
 
+def _summary(block: Block) -> Tuple[int, int, int, int, int]:
+    """Return the number of unit cells of each colour along the top, right,
+    bottom and left edges of <block>, and in all of <block>, in that order.
+
+    Each of the five is the counts of the colours in COLOUR_LIST packed into
+    one int, which _count takes apart. Like _flatten, the result is cached on
+    <block>, so after a move only the summaries of the Blocks on the path down
+    to the changed Block are worked out again, each from the summaries of its
+    children.
+    """
+    return block.cached('summary', _summary_uncached)
+
+
+def _summary_uncached(block: Block) -> Tuple[int, int, int, int, int]:
+    """Return _summary(<block>), working it out from the summaries of the
+    children of <block>.
+    """
+    if len(block.children) == 0:
+        return _leaf_summary(block.colour, block.max_depth - block.level)
+    return _combine([_summary(child) for child in block.children])
+
+
+def _leaf_summary(colour: Tuple[int, int, int], height: int) \
+        -> Tuple[int, int, int, int, int]:
+    """Return the summary of a leaf of <colour> that is <height> levels above
+    the unit cells.
+    """
+    index = _COLOUR_INDEX.get(colour)
+    if index is None:
+        return 0, 0, 0, 0, 0
+    edge = 1 << height << (index * _COUNT_BITS)
+    return edge, edge, edge, edge, edge << height
+
+
+def _combine(children: List[Tuple[int, int, int, int, int]]) \
+        -> Tuple[int, int, int, int, int]:
+    """Return the summary of a Block whose children have the summaries in
+    <children>, in the order of Block.children.
+    """
+    upper_right, upper_left, lower_left, lower_right = children
+    return (upper_left[0] + upper_right[0],
+            upper_right[1] + lower_right[1],
+            lower_left[2] + lower_right[2],
+            upper_left[3] + lower_left[3],
+            upper_right[4] + upper_left[4] + lower_left[4] + lower_right[4])
+
+
+def _count(counts: int, index: int) -> int:
+    """Return the count of the colour at <index> in COLOUR_LIST among the
+    packed <counts>.
+    """
+    return counts >> (index * _COUNT_BITS) & _COUNT_MASK
+
+
+def _summary_after(block: Block, action: Tuple[str, Optional[int]],
+                   colour: Tuple[int, int, int]) \
+        -> Optional[Tuple[int, int, int, int, int]]:
+    """Return the summary that <block> would have after <action> is performed
+    on it by a player with a goal of <colour>, without performing it, or None
+    if that cannot be known beforehand.
+
+    A swap or rotate only reorders the children of <block>, so its summary is
+    made from theirs. Smash uses random numbers, and combine is left unknown.
+    """
+    if action in _REORDERED:
+        children = [_summary(child) for child in block.children]
+        return _combine([children[i] for i in _REORDERED[action]])
+    if action == PAINT:
+        return _leaf_summary(colour, block.max_depth - block.level)
+    return None
+
+
+def _exposed(board: Block, block: Block) -> List[bool]:
+    """Return whether the top, right, bottom and left edges of <block> are on
+    the top, right, bottom and left edges of <board>, in that order.
+
+    Precondition:
+        - <block> is <board> or one of its descendants
+    """
+    depth = block.level - board.level
+    column, row = block.cell
+    left, top = board.cell
+    column -= left << depth
+    row -= top << depth
+    last = (1 << depth) - 1
+    return [row == 0, column == last, row == last, column == 0]
+
+
+def _flatten_array(block: Block) -> Any:
+    """Return a two-dimensional NumPy array representing <block> as columns
+    and rows of unit cells, laid out like the result of _flatten.
+
+    Each unit cell holds the index in COLOUR_LIST of its colour, as a uint8.
+
+    Like _flatten, the result is cached on <block> and must not be mutated.
+
+    Precondition:
+        - NumPy is installed and every leaf of <block> has a colour from
+          COLOUR_LIST
+    """
+    return block.cached('array', _flatten_array_uncached)
+
+
+def _flatten_array_uncached(block: Block) -> Any:
+    """Return _flatten_array(<block>) without looking at any cache."""
+    length = 1 << (block.max_depth - block.level)
+    cells = numpy.empty((length, length), dtype=numpy.uint8)
+    _fill_array(block, cells, 0, 0, length)
+    return cells
+
+
+def _fill_array(block: Block, cells: Any, x: int, y: int, side: int) -> None:
+    """Fill the <side> by <side> square of <cells> with upper left unit cell
+    at column <x> and row <y> with the colour indices of <block>.
+    """
+    if len(block.children) == 0:
+        cells[x:x + side, y:y + side] = _COLOUR_INDEX[block.colour]
+    else:
+        side >>= 1
+        for child, offset in zip(block.children, CHILD_OFFSETS):
+            _fill_array(child, cells, x + offset[0] * side,
+                        y + offset[1] * side, side)
+
+
+def _flatten_indices(block: Block) -> List[List[int]]:
+    """Return _flatten(<block>), with each unit cell holding the index in
+    COLOUR_LIST of its colour instead of the colour itself.
+    """
+    if ARRAY_MODE:
+        return _flatten_array(block).tolist()
+    return [[_COLOUR_INDEX[colour] for colour in column]
+            for column in _flatten(block)]
+
+
+def _label_array(cells: Any) -> Tuple[Any, Any, Any]:
+    """Label the blobs of the array of colour indices <cells>.
+
+    Return a parallel array with the label of the blob of each unit cell, an
+    array with the size of each blob, and an array with the colour index of
+    each blob. Labels start at 0 and have no gaps.
+
+    Runs of one colour down each column are found with array operations, and
+    only the runs are joined into blobs one at a time.
+    """
+    # A new run starts at the top of every column and wherever the colour
+    # changes going down a column
+    starts = numpy.ones(cells.shape, dtype=bool)
+    starts[:, 1:] = cells[:, 1:] != cells[:, :-1]
+    runs = numpy.cumsum(starts.ravel()).reshape(cells.shape) - 1
+    count = int(runs[-1, -1]) + 1
+    run_colours = cells.ravel()[starts.ravel()]
+
+    # Join runs in neighbouring columns that touch and have the same colour.
+    # Two such runs touch in the row where the lower of them starts, so only
+    # the rows where a run starts need to be compared.
+    same = (cells[:-1, :] == cells[1:, :]) & (starts[:-1, :] | starts[1:, :])
+    pairs = numpy.unique(runs[:-1][same].astype(numpy.int64) * count +
+                         runs[1:][same])
+    parent = list(range(count))
+    for pair in pairs.tolist():
+        a, b = _find(parent, pair // count), _find(parent, pair % count)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    roots = numpy.array([_find(parent, run) for run in range(count)])
+    blob_roots, run_labels = numpy.unique(roots, return_inverse=True)
+    labels = run_labels.reshape(count)[runs]
+    return labels, numpy.bincount(labels.ravel()), run_colours[blob_roots]
+
+
+def _find(parent: List[int], item: int) -> int:
+    """Return the representative of <item> in the union-find forest
+    <parent>, shortening the path to it along the way.
+    """
+    while parent[item] != item:
+        parent[item] = parent[parent[item]]
+        item = parent[item]
+    return item
+
+
+class _BlobIndex:
+    """A labelling of the unit cells of a board into blobs, that is, connected
+    groups of unit cells of the same colour.
+
+    A _BlobIndex observes the Block it was built for. When a move changes some
+    Block of the board, only the blobs that touch or border the changed Block
+    are labelled again; every other blob keeps its label and size. In array
+    mode, a change to a large share of the board instead labels the whole
+    board again with array operations, the next time a score is needed.
+
+    A copy of a _BlobIndex shares the columns of its labelling with the index
+    it was copied from, and each of them copies a column only when it first
+    changes it, so copying an index for a snapshot is cheap.
+    """
+    # === Private Attributes ===
+    # _cells:
+    #   The flattened board, in the same layout as returned by _flatten, but
+    #   with the index in COLOUR_LIST of each colour.
+    # _labels:
+    #   A parallel structure holding the label of the blob of each unit cell,
+    #   or -1 while the unit cell is waiting to be labelled.
+    # _sizes:
+    #   The number of unit cells in each blob, by label.
+    # _colours:
+    #   The colour index of each blob, by label.
+    # _next_label:
+    #   The label to give to the next blob found.
+    # _largest:
+    #   The size of the largest blob of each colour index, or None if it has
+    #   to be worked out again.
+    # _stale:
+    #   True if _labels, _sizes and _colours are out of date with _cells, and
+    #   the whole board must be labelled again before they are used.
+    # _own_cells:
+    #   Whether each column of _cells belongs to this index alone, rather than
+    #   being shared with a copy of it.
+    # _own_labels:
+    #   Whether each column of _labels belongs to this index alone.
+    # _own_blobs:
+    #   Whether _sizes and _colours belong to this index alone.
+    # _pending:
+    #   The changed Blocks, with the column and row of their upper left unit
+    #   cells, that have not been looked at yet, in the order they changed.
+    #   A change is put off while the Block is not complete, such as while its
+    #   children are being replaced one at a time, and every later change is
+    #   put off after it.
+    _cells: List[List[int]]
+    _labels: List[List[int]]
+    _sizes: Dict[int, int]
+    _colours: Dict[int, int]
+    _next_label: int
+    _largest: Optional[Dict[int, int]]
+    _stale: bool
+    _own_cells: List[bool]
+    _own_labels: List[bool]
+    _own_blobs: bool
+    _pending: List[Tuple[Block, int, int]]
+
+    def __init__(self, board: Optional[Block]) -> None:
+        """Initialize this index with the blobs of <board>.
+
+        If <board> is None, the index is left empty.
+        """
+        self._sizes = {}
+        self._colours = {}
+        self._next_label = 0
+        self._largest = None
+        self._stale = False
+        self._own_blobs = True
+        self._pending = []
+        if board is None:
+            self._cells = []
+            self._labels = []
+            self._own_labels = []
+        elif ARRAY_MODE:
+            cells = _flatten_array(board)
+            self._cells = cells.tolist()
+            self._label_all(cells)
+        else:
+            self._cells = _flatten_indices(board)
+            self._labels = [[-1] * len(column) for column in self._cells]
+            self._own_labels = [True] * len(self._labels)
+            for i in range(len(self._cells)):
+                for j in range(len(self._cells)):
+                    if self._labels[i][j] == -1:
+                        self._label_blob(i, j)
+        self._own_cells = [True] * len(self._cells)
+
+    def copy(self) -> _BlobIndex:
+        """Return a copy of this index that can be updated independently.
+
+        The copy shares every column and blob with this index until one of
+        them changes it.
+        """
+        other = _BlobIndex(None)
+        other._cells = list(self._cells)
+        other._labels = list(self._labels)
+        other._sizes = self._sizes
+        other._colours = self._colours
+        other._next_label = self._next_label
+        other._largest = self._largest
+        other._stale = self._stale
+        other._pending = list(self._pending)
+        other._own_cells = [False] * len(self._cells)
+        other._own_labels = [False] * len(self._labels)
+        other._own_blobs = False
+        self._own_cells = list(other._own_cells)
+        self._own_labels = list(other._own_labels)
+        self._own_blobs = False
+        return other
+
+    def _cells_column(self, i: int) -> List[int]:
+        """Return column <i> of _cells to be changed, copying it first if it
+        is shared.
+        """
+        if not self._own_cells[i]:
+            self._cells[i] = list(self._cells[i])
+            self._own_cells[i] = True
+        return self._cells[i]
+
+    def _labels_column(self, i: int) -> List[int]:
+        """Return column <i> of _labels to be changed, copying it first if it
+        is shared.
+        """
+        if not self._own_labels[i]:
+            self._labels[i] = list(self._labels[i])
+            self._own_labels[i] = True
+        return self._labels[i]
+
+    def _own_blob_sizes(self) -> None:
+        """Copy _sizes and _colours if they are shared, so that they can be
+        changed.
+        """
+        if not self._own_blobs:
+            self._sizes = dict(self._sizes)
+            self._colours = dict(self._colours)
+            self._own_blobs = True
+
+    def largest(self, colour: Tuple[int, int, int]) -> int:
+        """Return the size of the largest blob of <colour>, or 0 if there
+        are no unit cells of <colour>.
+        """
+        return self.largest_sizes().get(_COLOUR_INDEX.get(colour), 0)
+
+    def largest_sizes(self) -> Dict[int, int]:
+        """Return the size of the largest blob of each colour index that has
+        any unit cells.
+
+        The dictionary returned must not be mutated.
+        """
+        self._catch_up()
+        if self._largest is None:
+            self._largest = {}
+            for label, size in self._sizes.items():
+                c = self._colours[label]
+                if size > self._largest.get(c, 0):
+                    self._largest[c] = size
+        return self._largest
+
+    def sizes(self) -> Dict[int, List[int]]:
+        """Return the sizes of the blobs of each colour index that has any,
+        from the largest to the smallest.
+        """
+        self._catch_up()
+        sizes = {}
+        for label, size in self._sizes.items():
+            sizes.setdefault(self._colours[label], []).append(size)
+        for colour_sizes in sizes.values():
+            colour_sizes.sort(reverse=True)
+        return sizes
+
+    def _catch_up(self) -> None:
+        """Look at the changes that were put off, and label the whole board
+        again if the labels are out of date.
+        """
+        pending, self._pending = self._pending, []
+        for block, x, y in pending:
+            self._update(block, x, y)
+        if self._stale:
+            self._label_all(numpy.array(self._cells, dtype=numpy.uint8))
+
+    def block_changed(self, block: Block, x: int, y: int) -> None:
+        """Update this index after the unit cells covered by <block> changed.
+
+        <x> and <y> are the column and row of the upper left unit cell of
+        <block> on the board. If <block> has neither a colour nor four
+        children yet, the update waits until the blobs are next needed.
+        """
+        count = len(block.children)
+        if self._pending or count not in (0, 4) or \
+                count == 0 and block.colour is None:
+            self._pending.append((block, x, y))
+        else:
+            self._update(block, x, y)
+
+    def _update(self, block: Block, x: int, y: int) -> None:
+        """Update this index after the unit cells covered by <block>, whose
+        upper left unit cell is at column <x> and row <y>, changed.
+        """
+        sub = _flatten_indices(block)
+        side = len(sub)
+        length = len(self._cells)
+        if self._stale or (ARRAY_MODE and
+                           side * side * _RELABEL_SHARE >= length * length):
+            for i in range(side):
+                self._cells_column(x + i)[y:y + side] = sub[i]
+            self._stale = True
+            self._largest = None
+            return
+
+        # Forget every blob that touches <block> or borders it. Only their unit
+        # cells can end up in a different blob.
+        self._own_blob_sizes()
+        waiting = []
+        low, high = max(y - 1, 0), min(y + side + 1, length)
+        for i in range(max(x - 1, 0), min(x + side + 1, length)):
+            column = self._labels[i]
+            for label in set(column[low:high]):
+                if label != -1:
+                    self._forget_blob(i, column.index(label, low), waiting)
+
+        for i in range(side):
+            self._cells_column(x + i)[y:y + side] = sub[i]
+
+        for i, low, high in waiting:
+            column = self._labels[i]
+            for j in range(low, high + 1):
+                if column[j] == -1:
+                    self._label_blob(i, j)
+        self._largest = None
+
+    def _label_all(self, cells: Any) -> None:
+        """Label every blob of the board again from <cells>, the NumPy array
+        of the colour indices in _cells.
+        """
+        labels, sizes, colours = _label_array(cells)
+        self._labels = labels.tolist()
+        self._sizes = dict(enumerate(sizes.tolist()))
+        self._colours = dict(enumerate(colours.tolist()))
+        self._next_label = len(self._sizes)
+        self._largest = None
+        self._stale = False
+        self._own_labels = [True] * len(self._labels)
+        self._own_blobs = True
+
+    def _forget_blob(self, i: int, j: int,
+                     waiting: List[Tuple[int, int, int]]) -> None:
+        """Remove the label of every unit cell in the blob at column <i> and
+        row <j>.
+
+        Add each run of those cells down a column to <waiting>, as its column
+        and its first and last row.
+        """
+        labels = self._labels
+        length = len(labels)
+        label = labels[i][j]
+        stack = [(i, j)]
+        while stack:
+            i, j = stack.pop()
+            column = labels[i]
+            if column[j] != label:
+                # Forgotten with another run since it was pushed
+                continue
+            column = self._labels_column(i)
+            low = j
+            while low > 0 and column[low - 1] == label:
+                low -= 1
+            high = j
+            while high < length - 1 and column[high + 1] == label:
+                high += 1
+            column[low:high + 1] = [-1] * (high - low + 1)
+            waiting.append((i, low, high))
+
+            for a in (i - 1, i + 1):
+                if 0 <= a < length:
+                    other = labels[a]
+                    in_run = False
+                    for b in range(low, high + 1):
+                        if other[b] == label:
+                            if not in_run:
+                                stack.append((a, b))
+                                in_run = True
+                        else:
+                            in_run = False
+        del self._sizes[label]
+        del self._colours[label]
+
+    def _label_blob(self, i: int, j: int) -> None:
+        """Give a new label to the blob at column <i> and row <j>, made of
+        unit cells that are waiting to be labelled.
+
+        The blob is filled one run of cells down a column at a time, using an
+        explicit stack instead of recursion so that any board size works.
+        """
+        cells, labels = self._cells, self._labels
+        length = len(cells)
+        label = self._next_label
+        self._next_label += 1
+        colour = cells[i][j]
+        size = 0
+        stack = [(i, j)]
+        while stack:
+            i, j = stack.pop()
+            column, column_labels = cells[i], labels[i]
+            if column_labels[j] != -1:
+                # Labelled by another run since it was pushed
+                continue
+            column_labels = self._labels_column(i)
+            low = j
+            while low > 0 and column_labels[low - 1] == -1 and \
+                    column[low - 1] == colour:
+                low -= 1
+            high = j
+            while high < length - 1 and column_labels[high + 1] == -1 and \
+                    column[high + 1] == colour:
+                high += 1
+            column_labels[low:high + 1] = [label] * (high - low + 1)
+            size += high - low + 1
+
+            # Push the first cell of each run next to this one in the
+            # neighbouring columns
+            for a in (i - 1, i + 1):
+                if 0 <= a < length:
+                    other, other_labels = cells[a], labels[a]
+                    in_run = False
+                    for b in range(low, high + 1):
+                        if other_labels[b] == -1 and other[b] == colour:
+                            if not in_run:
+                                stack.append((a, b))
+                                in_run = True
+                        else:
+                            in_run = False
+        self._sizes[label] = size
+        self._colours[label] = colour
+
+
 class Goal:
     """A player goal in the game of Blocky.
 
@@ -124,6 +706,30 @@ class Goal:
         """
         raise NotImplementedError
 
+    def score_shared(self, board: Block, shared: Dict[type, Any]) -> int:
+        """Return the score for this goal on <board>, reusing what other goals
+        scoring <board> left in <shared> and leaving there what they can reuse.
+
+        <shared> is kept by goal class, and must start out empty for each
+        board. By default nothing is shared.
+        """
+        return self.score(board)
+
+    def upper_bound(self, board: Block, block: Block,
+                    action: Tuple[str, Optional[int]]) -> int:
+        """Return a number that the score for this goal on <board> cannot be
+        more than after <action> is performed on <block>, without performing
+        it.
+
+        The bound is worked out from the summaries of <board> and <block>, so
+        it takes the same time for any size of board once they are cached.
+
+        Precondition:
+            - <block> is <board> or one of its descendants, and <action> is a
+              valid move on it
+        """
+        raise NotImplementedError
+
     def description(self) -> str:
         """Return a description of this goal."""
         raise NotImplementedError
@@ -134,19 +740,51 @@ class PerimeterGoal(Goal):
     player colours around the perimeter of the box"""
 
     def score(self, board: Block) -> int:
-        """Calculates the score for perimeter goal"""
-        flattened = _flatten(board)
-        score = 0
-        length = len(flattened)
-        for i in range(length):
-            if flattened[i][0] == self.colour:
-                score += 1
-            if flattened[i][-1] == self.colour:
-                score += 1
-            if flattened[0][i] == self.colour:
-                score += 1
-            if flattened[-1][i] == self.colour:
-                score += 1
+        """Calculates the score for perimeter goal
+
+        The score is read off the counts of each colour along the edges of
+        <board> in its summary.
+        """
+        index = _COLOUR_INDEX.get(self.colour)
+        if index is None:
+            return 0
+        top, right, bottom, left, _ = _summary(board)
+        return _count(top + right + bottom + left, index)
+
+    def score_shared(self, board: Block, shared: Dict[type, Any]) -> int:
+        """Return the score for this goal on <board>, sharing the edge counts
+        of every colour with the other PerimeterGoals.
+        """
+        edges = shared.get(PerimeterGoal)
+        if edges is None:
+            top, right, bottom, left, _ = _summary(board)
+            edges = shared[PerimeterGoal] = top + right + bottom + left
+        index = _COLOUR_INDEX.get(self.colour)
+        if index is None:
+            return 0
+        return _count(edges, index)
+
+    def upper_bound(self, board: Block, block: Block,
+                    action: Tuple[str, Optional[int]]) -> int:
+        """Return a number that the score for this goal on <board> cannot be
+        more than after <action> is performed on <block>, without performing
+        it.
+
+        Only the edges of <block> that are on the edges of <board> count
+        towards the score. Unless the summary of <block> after the move cannot
+        be known, the bound is the score after the move.
+        """
+        index = _COLOUR_INDEX.get(self.colour)
+        if index is None:
+            return 0
+        before = _summary(block)
+        after = _summary_after(block, action, self.colour)
+        side = 1 << (block.max_depth - block.level)
+        score = self.score(board)
+        for edge, exposed in enumerate(_exposed(board, block)):
+            if exposed:
+                score -= _count(before[edge], index)
+                score += side if after is None else _count(after[edge], index)
         return score
 
     def description(self) -> str:
@@ -161,20 +799,40 @@ class BlobGoal(Goal):
     a point for each block connected together."""
 
     def score(self, board: Block) -> int:
-        """Calculates the score for blob goal"""
-        score = []
-        flatten_board = _flatten(board)
-        board_size = len(flatten_board)
-        # fill the board with -1's
-        visit = [[-1] * board_size for _ in range(board_size)]
-
-        for i in range(board_size):
-            for w in range(board_size):
-                if visit[i][w] == -1:
-                    score.append \
-                        (self._undiscovered_blob_size
-                         ((i, w), flatten_board, visit))
-        return max(score)
+        """Calculates the score for blob goal
+
+        The blobs of <board> are kept in a _BlobIndex that observes <board>, so
+        scoring the board again after a move only labels again the blobs
+        around the Block that the move changed.
+        """
+        return _blob_index(board).largest(self.colour)
+
+    def score_shared(self, board: Block, shared: Dict[type, Any]) -> int:
+        """Return the score for this goal on <board>, sharing the largest blob
+        of every colour with the other BlobGoals.
+        """
+        largest = shared.get(BlobGoal)
+        if largest is None:
+            largest = shared[BlobGoal] = _blob_index(board).largest_sizes()
+        return largest.get(_COLOUR_INDEX.get(self.colour), 0)
+
+    def upper_bound(self, board: Block, block: Block,
+                    action: Tuple[str, Optional[int]]) -> int:
+        """Return a number that the score for this goal on <board> cannot be
+        more than after <action> is performed on <block>, without performing
+        it.
+
+        No blob can have more unit cells than there are of its colour on the
+        board, which is counted in the summaries of <board> and <block>.
+        """
+        index = _COLOUR_INDEX.get(self.colour)
+        if index is None:
+            return 0
+        after = _summary_after(block, action, self.colour)
+        side = 1 << (block.max_depth - block.level)
+        return _count(_summary(board)[4], index) - \
+            _count(_summary(block)[4], index) + \
+            (side * side if after is None else _count(after[4], index))
 
     def _undiscovered_blob_size(self, pos: Tuple[int, int],
                                 board: List[List[Tuple[int, int, int]]],
@@ -196,23 +854,32 @@ class BlobGoal(Goal):
         Update <visited> so that all cells that are visited are marked with
         either 0 or 1.
         """
-        if len(board) > pos[0] >= 0 and len(board) > pos[1] >= 0 and \
-                visited[pos[0]][pos[1]] == -1:
-            # if it is that colour
-            if board[pos[0]][pos[1]] == self.colour:
-                visited[pos[0]][pos[1]] = 1
-                size = 1
-                # 2 for loops checks left, top, right, bottom
-                for i in range(-1, 2):
-                    size += self._undiscovered_blob_size \
-                        ((i + pos[0], pos[1]), board, visited)
-                for w in range(-1, 2):
-                    size += self._undiscovered_blob_size \
-                        ((pos[0], w + pos[1]), board, visited)
-                return size
-            else:
-                visited[pos[0]][pos[1]] = 0
-        return 0
+        length = len(board)
+        if not (length > pos[0] >= 0 and length > pos[1] >= 0) or \
+                visited[pos[0]][pos[1]] != -1:
+            return 0
+        if board[pos[0]][pos[1]] != self.colour:
+            visited[pos[0]][pos[1]] = 0
+            return 0
+
+        # Use an explicit stack of cells to visit, so that deep boards do not
+        # run into the recursion limit
+        visited[pos[0]][pos[1]] = 1
+        size = 0
+        stack = [pos]
+        while stack:
+            i, j = stack.pop()
+            size += 1
+            # checks left, right, top, bottom
+            for a, b in ((i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)):
+                if length > a >= 0 and length > b >= 0 and \
+                        visited[a][b] == -1:
+                    if board[a][b] == self.colour:
+                        visited[a][b] = 1
+                        stack.append((a, b))
+                    else:
+                        visited[a][b] = 0
+        return size
 
     def description(self) -> str:
         """Returns a description for blob goal"""
@@ -226,7 +893,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'block', 'settings',
-            'math', '__future__'
+            'math', '__future__', 'numpy', 'actions'
         ],
         'max-attributes': 15
     })
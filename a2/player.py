@@ -22,15 +22,38 @@ Misha Schwartz, and Jaisie Sin.
 This file contains the hierarchy of player classes.
 """
 from __future__ import annotations
-from typing import List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, \
+    TYPE_CHECKING
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import math
 import random
-import pygame
+import time
 
-from block import Block
+from block import Block, BlockChange, CHILD_OFFSETS, decode_board
 from goal import Goal, generate_goals
+from settings import COLOUR_LIST
 
-from actions import KEY_ACTION, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
+
+if TYPE_CHECKING:
+    # Events only come from the user interface, which loads pygame itself
+    import pygame
+
+# The index in Block.children of the child at each offset in CHILD_OFFSETS
+_CHILD_AT = {offset: i for i, offset in enumerate(CHILD_OFFSETS)}
+
+
+@functools.lru_cache(maxsize=None)
+def _controls() -> Any:
+    """Return the controls module.
+
+    It is imported the first time a player handles an event, rather than with
+    this module, since it loads pygame and only the user interface needs it.
+    """
+    import controls
+    return controls
 
 
 def create_players(num_human: int, num_random: int, smart_players: List[int]) \
@@ -79,20 +102,101 @@ def _get_block(block: Block, location: Tuple[int, int], level: int) -> \
     Preconditions:
         - 0 <= level <= max_depth
     """
-    if len(block.children) == 0 and level >= block.level or \
-            len(block.children) == 4 and level == block.level:
-        if block.position[0] <= location[0] < block.position[0] + block.size \
-                and block.position[1] <= location[1] < block.position[1] + \
-                block.size:
-            return block
-        else:
+    level = max(level, block.level)
+    cell = block.cell_of(location, level)
+    if cell is None:
+        return None
+    # Go straight down to the child that <location> is in, whose offset is
+    # given by one bit of the column and row of <location> at each level
+    column, row = cell
+    shift = level - block.level
+    while len(block.children) == 4 and block.level < level:
+        shift -= 1
+        block = block.children[_CHILD_AT[(column >> shift & 1,
+                                          row >> shift & 1)]]
+    return block
+
+
+class _BlockIndex:
+    """An index of the Blocks of a board by their level and cell, for finding
+    the Block at a location without going down the tree.
+
+    The cell of a Block is its column and row among the Blocks that could be at
+    its level. The index observes the board, and brings itself up to date with
+    the changes to the board the next time it is used.
+    """
+    # === Private Attributes ===
+    # _board:
+    #   The board that is indexed.
+    # _blocks:
+    #   The Block at each (level, column, row) that has one.
+    # _stale:
+    #   The (level, column, row) of each Block that changed since the index was
+    #   last brought up to date.
+    _board: Block
+    _blocks: Dict[Tuple[int, int, int], Block]
+    _stale: Set[Tuple[int, int, int]]
+
+    def __init__(self, board: Block) -> None:
+        """Initialize an index of the Blocks of <board>, which must be the root
+        of its tree.
+        """
+        self._board = board
+        self._blocks = {}
+        self._stale = set()
+        self._add(board, 0, 0)
+
+    def block_changed(self, block: Block, x: int, y: int) -> None:
+        """Remember that <block>, whose upper left unit cell is at column <x>
+        and row <y>, has changed.
+        """
+        shift = block.max_depth - block.level
+        self._stale.add((block.level, x >> shift, y >> shift))
+
+    def get_block(self, location: Tuple[int, int], level: int) \
+            -> Optional[Block]:
+        """Return the same Block as _get_block(board, <location>, <level>)."""
+        self._refresh()
+        cell = self._board.cell_of(location, level)
+        if cell is None:
             return None
-    else:
-        for i in range(0, 4):
-            if _get_block(block.children[i], location, level) is not None:
-                return _get_block(block.children[i], location, level)
+        column, row = cell
+        # The cell at each level above contains the cell below it
+        for depth in range(level, -1, -1):
+            block = self._blocks.get((depth, column, row))
+            if block is not None:
+                return block
+            column >>= 1
+            row >>= 1
         return None
 
+    def _refresh(self) -> None:
+        """Index the Blocks below each Block that changed again."""
+        for level, column, row in self._stale:
+            if not any((above, column >> (level - above),
+                        row >> (level - above)) in self._stale
+                       for above in range(level)):
+                # None of its ancestors changed, so it is still in its cell
+                block = self._blocks[(level, column, row)]
+                self._remove(level, column, row)
+                self._add(block, column, row)
+        self._stale = set()
+
+    def _add(self, block: Block, column: int, row: int) -> None:
+        """Index <block>, in <column> and <row>, and its descendants."""
+        self._blocks[(block.level, column, row)] = block
+        for i in range(len(block.children)):
+            self._add(block.children[i], 2 * column + CHILD_OFFSETS[i][0],
+                      2 * row + CHILD_OFFSETS[i][1])
+
+    def _remove(self, level: int, column: int, row: int) -> None:
+        """Remove the Block in <column> and <row> at <level>, and the Blocks in
+        the cells below it, from the index.
+        """
+        if self._blocks.pop((level, column, row), None) is not None:
+            for dx, dy in CHILD_OFFSETS:
+                self._remove(level + 1, 2 * column + dx, 2 * row + dy)
+
 
 class Player:
     """A player in the Blocky game.
@@ -124,6 +228,23 @@ class Player:
         """Update this player based on the pygame event."""
         raise NotImplementedError
 
+    def proceed(self) -> None:
+        """Let this player make its next move without waiting for a mouse
+        click.
+
+        This does nothing for players that do not wait for one.
+        """
+        return
+
+    def close(self) -> None:
+        """Release what this player keeps between moves, such as worker
+        processes, at the end of a game. The player can still make moves
+        afterwards.
+
+        This does nothing for players that keep nothing.
+        """
+        return
+
     def generate_move(self, board: Block) -> \
             Optional[Tuple[str, Optional[int], Block]]:
         """Return a potential move to make on the game board.
@@ -144,52 +265,97 @@ def _create_move(action: Tuple[str, Optional[int]], block: Block) -> \
     return action[0], action[1], block
 
 
-def _generate_random_valid_move(board: Block, location: Tuple[int, int],
-                                level: int, colour: Tuple[int, int, int]) \
-        -> Union[bool, Tuple[str, Optional[int]]]:
-    """Generates a random move(swap, paint, combine, smash, rotate)
-    If it does not work on given board, location and level, return False,
-    otherwise, returns True.
+def legal_moves(board: Block, colour: Tuple[int, int, int]) \
+        -> Iterator[Tuple[str, Optional[int], Block]]:
+    """Yield every valid move, other than PASS, that a player whose goal has
+    <colour> can make on <board>.
+
+    Each Block of <board> is visited once, and each valid move on it is
+    yielded once, no matter how many locations on the screen select it. The
+    moves on a Block come before the moves on its descendants, and the moves
+    on its children come from the last child to the first.
     """
-    move = 0
-    valid_move = False
-    rand_block_1 = _get_block(board, location, level)
-    rand_move = random.randint(0, 6)
-    # TO TA OR PROFESSOR:
-    # WHY DOES THE "IF" RUNS THE ACTION????????????????????????????
-    if rand_move == 0:
-        if rand_block_1.swap(1):
-            valid_move = True
-            move = SWAP_VERTICAL
-    if rand_move == 1:
-        if rand_block_1.swap(0):
-            valid_move = True
-            move = SWAP_HORIZONTAL
-    if rand_move == 2:
-        if rand_block_1.rotate(1):
-            valid_move = True
-            move = ROTATE_CLOCKWISE
-    if rand_move == 3:
-        if rand_block_1.rotate(3):
-            valid_move = True
-            move = ROTATE_COUNTER_CLOCKWISE
-    if rand_move == 4:
-        if rand_block_1.smashable():
-            rand_block_1.smash()
-            valid_move = True
-            move = SMASH
-    if rand_move == 5:
-        if rand_block_1.paint(colour):
-            valid_move = True
-            move = PAINT
-    if rand_move == 6:
-        if rand_block_1.combine():
-            valid_move = True
-            move = COMBINE
-    if not valid_move:
-        return False
-    else:
-        return move
+    blocks = [board]
+    while blocks:
+        block = blocks.pop()
+        yield from _own_moves(block, colour)
+        blocks.extend(block.children)
+
+
+def _own_moves(block: Block, colour: Tuple[int, int, int]) \
+        -> List[Tuple[str, Optional[int], Block]]:
+    """Return the valid moves on <block> itself, other than PASS, for a player
+    whose goal has <colour>, in the order legal_moves yields them.
+    """
+    if len(block.children) == 4:
+        moves = [_create_move(action, block)
+                 for action in (ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,
+                                SWAP_HORIZONTAL, SWAP_VERTICAL)]
+        if block.combinable():
+            moves.append(_create_move(COMBINE, block))
+        return moves
+    moves = []
+    if block.smashable():
+        moves.append(_create_move(SMASH, block))
+    if block.paintable(colour):
+        moves.append(_create_move(PAINT, block))
+    return moves
+
+
+def _move_counts(block: Block) -> Tuple[int, ...]:
+    """Return the number of valid moves, other than PASS, on <block> and its
+    descendants for a player whose goal has each colour in COLOUR_LIST, in
+    that order.
+
+    The counts are cached on <block> and each of its descendants, so after a
+    move only the counts of the changed Block and its ancestors are worked
+    out again.
+    """
+    return block.cached('move counts', _move_counts_uncached)
+
+
+def _move_counts_uncached(block: Block) -> Tuple[int, ...]:
+    """Return _move_counts(<block>), counting the moves of the children of
+    <block> through their caches.
+    """
+    if len(block.children) == 4:
+        counts = [5 if block.combinable() else 4] * len(COLOUR_LIST)
+        for child in block.children:
+            for i, count in enumerate(_move_counts(child)):
+                counts[i] += count
+        return tuple(counts)
+    smash = 1 if block.smashable() else 0
+    return tuple(smash + (1 if block.paintable(colour) else 0)
+                 for colour in COLOUR_LIST)
+
+
+def random_move(board: Block, colour: Tuple[int, int, int]) \
+        -> Optional[Tuple[str, Optional[int], Block]]:
+    """Return a move picked at random from the moves yielded by
+    legal_moves(<board>, <colour>), each as likely as any other, or None if
+    there are none.
+
+    The move is found by going down from <board> to the Block it is on, using
+    the cached counts of the moves below each Block, rather than by listing
+    every move. It is the same move random.choice would pick from the list.
+    """
+    index = COLOUR_LIST.index(colour)
+    total = _move_counts(board)[index]
+    if total == 0:
+        return None
+    pick = random.randrange(total)
+    block = board
+    while True:
+        moves = _own_moves(block, colour)
+        if pick < len(moves):
+            return moves[pick]
+        pick -= len(moves)
+        for child in reversed(block.children):
+            count = _move_counts(child)[index]
+            if pick < count:
+                block = child
+                break
+            pick -= count
 
 
 class HumanPlayer(Player):
@@ -223,23 +389,28 @@ class HumanPlayer(Player):
 
         If no block is selected by the player, return None.
         """
-        mouse_pos = pygame.mouse.get_pos()
-        block = _get_block(board, mouse_pos, min(self._level, board.max_depth))
+        mouse_pos = _controls().mouse_position()
+        # This runs every frame, so look the block up in an index of the board
+        index = board.get_observer(_BlockIndex)
+        if index is None:
+            index = _BlockIndex(board)
+            board.add_observer(index)
+        block = index.get_block(mouse_pos, min(self._level, board.max_depth))
         return block
 
     def process_event(self, event: pygame.event.Event) -> None:
         """Respond to the relevant keyboard events made by the player based on
-        the mapping in KEY_ACTION, as well as the W and S keys for changing
+        the mapping in controls.KEY_ACTION, as well as the keys for changing
         the level.
         """
-        if event.type == pygame.KEYDOWN:
-            if event.key in KEY_ACTION:
-                self._desired_action = KEY_ACTION[event.key]
-            elif event.key == pygame.K_w:
-                self._level = max(0, self._level - 1)
-                self._desired_action = None
-            elif event.key == pygame.K_s:
-                self._level += 1
+        controls = _controls()
+        action = controls.key_action(event)
+        if action is not None:
+            self._desired_action = action
+        else:
+            change = controls.level_change(event)
+            if change != 0:
+                self._level = max(0, self._level + change)
                 self._desired_action = None
 
     def generate_move(self, board: Block) -> \
@@ -260,8 +431,8 @@ class HumanPlayer(Player):
 
 
 class RandomPlayer(Player):
-    """A computer player that randomly generates moves until it is a correct
-    move and plays that move onto the board.
+    """A computer player that plays a move chosen at random from the valid
+    moves on the board.
     """
     # === Private Attributes ===
     # _proceed:
@@ -284,8 +455,12 @@ class RandomPlayer(Player):
 
     def process_event(self, event: pygame.event.Event) -> None:
         """Respond to the mouse click by proceeding"""
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            self._proceed = True
+        if _controls().is_proceed(event):
+            self.proceed()
+
+    def proceed(self) -> None:
+        """Make the next move without waiting for a mouse click"""
+        self._proceed = True
 
     def generate_move(self, board: Block) -> \
             Optional[Tuple[str, Optional[int], Block]]:
@@ -298,24 +473,56 @@ class RandomPlayer(Player):
         """
         if not self._proceed:
             return None   # Do not change
-        rand_block_2 = None
-        valid_move = False
-        while valid_move is False:
-            a = board.create_copy()
-            level = random.randint(0, board.max_depth)
-            location = (random.randint(0, board.size-1),
-                        random.randint(0, board.size-1))
-            rand_block_2 = _get_block(board, location, level)
-            valid_move = _generate_random_valid_move \
-                (a, location, level, self.goal.colour)
-        move = _create_move(valid_move, rand_block_2)
+        move = random_move(board, self.goal.colour)
+        if move is None:
+            move = _create_move(PASS, board)
         self._proceed = False  # Must set to False before returning!
         return move
 
 
+def _score_candidates(
+        data: bytes, goal: Goal,
+        candidates: List[Tuple[List[int], Tuple[str, Optional[int]], int]]) \
+        -> List[int]:
+    """Return the score for <goal> after each of <candidates> is made on the
+    board encoded as <data>.
+
+    Each candidate is the path from the board to a Block, an action to do to
+    that Block, and the seed for the random numbers the action uses. This is
+    run by the worker processes of a SmartPlayer.
+    """
+    board = decode_board(data)
+    score = []
+    for path, action, seed in candidates:
+        random.seed(seed)
+        change = board.descendant(path).perform(action, goal.colour)
+        score.append(goal.score(board))
+        change.undo()
+    return score
+
+
 class SmartPlayer(Player):
-    """A smart computer player where they randomly generate a number of
+    """A smart computer player where they randomly pick a number of valid
     moves and decides the best moves to plays.
+
+    In exhaustive mode, the player instead considers every valid move on the
+    board, and always plays the first of the best moves. A move is only made
+    and scored if an upper bound on its score (see Goal.upper_bound) shows
+    that it could be that move; the other moves are pruned.
+
+    In parallel mode, the moves are scored by a pool of worker processes.
+    Each move that uses random numbers is given its own seed, so the move
+    played only depends on the state of the random module, and not on how
+    the moves are shared out between the workers.
+
+    === Public Attributes ===
+    moves_per_second:
+        The number of moves made and scored per second while choosing the
+        most recent move, or 0.0 if no move has been scored yet. Pruned moves
+        are not counted.
+    moves_pruned:
+        The number of moves that were pruned instead of scored while choosing
+        the most recent move.
     """
     # === Private Attributes ===
     # _proceed:
@@ -325,17 +532,41 @@ class SmartPlayer(Player):
     #    The level of the Block that the user selected most recently.
     # _difficulty:
     #   The difficulty it is to play against the smart player
+    # _exhaustive:
+    #   True if every valid move is scored instead of <_difficulty> random
+    #   ones.
+    # _workers:
+    #   The number of worker processes that score moves, or None if moves are
+    #   scored in this process.
+    # _pool:
+    #   The pool of worker processes, or None if it has not been started.
+    moves_per_second: float
+    moves_pruned: int
     _proceed: bool
     _level: int
     _difficulty: int
+    _exhaustive: bool
+    _workers: Optional[int]
+    _pool: Optional[ProcessPoolExecutor]
 
-    def __init__(self, player_id: int, goal: Goal, difficulty: int) -> None:
+    def __init__(self, player_id: int, goal: Goal, difficulty: int,
+                 exhaustive: bool = False,
+                 workers: Optional[int] = None) -> None:
         """Initialize a smart player with given player_id, goal and difficulty
+
+        If <exhaustive> is True, <difficulty> is ignored and every valid move
+        is scored. If <workers> is not None, moves are scored by that many
+        worker processes, which are started when they are first needed.
         """
         super().__init__(player_id, goal)
         self._level = 0
         self._proceed = False
         self._difficulty = difficulty
+        self._exhaustive = exhaustive
+        self._workers = workers
+        self._pool = None
+        self.moves_per_second = 0.0
+        self.moves_pruned = 0
 
     def get_selected_block(self, board: Block) -> Optional[Block]:
         """Return the selected block for the move"""
@@ -343,8 +574,12 @@ class SmartPlayer(Player):
 
     def process_event(self, event: pygame.event.Event) -> None:
         """Respond to relevant event when mouse is clicked"""
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            self._proceed = True
+        if _controls().is_proceed(event):
+            self.proceed()
+
+    def proceed(self) -> None:
+        """Make the next move without waiting for a mouse click"""
+        self._proceed = True
 
     def generate_move(self, board: Block) -> \
             Optional[Tuple[str, Optional[int], Block]]:
@@ -361,25 +596,31 @@ class SmartPlayer(Player):
         if not self._proceed:
             return None  # Do not remove
 
-        lst = []
-        score = []
-        rand = 0
+        start = time.perf_counter()
+        self.moves_pruned = 0
         curr_score = self.goal.score(board)
-        a = board.create_copy()
-
-        for _ in range(self._difficulty):
-            move = False
-            while move is False:
-                a = board.create_copy()
-                level = random.randint(0, board.max_depth)
-                location = (random.randint(0, board.size-1),
-                            random.randint(0, board.size-1))
-                move = _generate_random_valid_move \
-                    (a, location, level, self.goal.colour)
-                rand = _get_block(board, location, level)
-            score.append(self.goal.score(a))
-            lst.append(_create_move(move, rand))
-        if max(score) <= curr_score:
+        moves = list(legal_moves(board, self.goal.colour))
+        if self._workers is not None:
+            if self._exhaustive:
+                lst = moves
+                state = random.getstate()
+                score = self._score_parallel(board, lst)
+                random.setstate(state)
+            else:
+                lst = [random.choice(moves)
+                       for _ in range(self._difficulty if moves else 0)]
+                score = self._score_parallel(board, lst)
+        elif self._exhaustive:
+            lst = moves
+            score = self._score_all(board, moves, curr_score)
+        else:
+            lst, score = self._score_random(board, moves)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.moves_per_second = \
+                (len(score) - self.moves_pruned) / elapsed
+
+        if len(score) == 0 or max(score) <= curr_score:
             self._proceed = False  # Must set to False before returning!
             return _create_move(PASS, board)
         else:
@@ -387,6 +628,596 @@ class SmartPlayer(Player):
             self._proceed = False  # Must set to False before returning!
             return lst[num]
 
+    def _score_random(self, board: Block,
+                      moves: List[Tuple[str, Optional[int], Block]]) \
+            -> Tuple[List[Tuple[str, Optional[int], Block]], List[int]]:
+        """Return <_difficulty> moves picked at random from <moves>, and the
+        score for this player's goal after each of them is made on <board>.
+        """
+        lst = []
+        score = []
+        for _ in range(self._difficulty if moves else 0):
+            move = random.choice(moves)
+            # Try the move on a snapshot, which only copies the path down to
+            # the block and shares the rest of the board
+            a, copy = board.snapshot(move[2])
+            copy.perform((move[0], move[1]), self.goal.colour)
+            score.append(self.goal.score(a))
+            lst.append(move)
+        return lst, score
+
+    def _score_all(self, board: Block,
+                   moves: List[Tuple[str, Optional[int], Block]],
+                   floor: Optional[int] = None) -> List[int]:
+        """Return the score for this player's goal after each of <moves> is
+        made on <board>.
+
+        Each move is made on <board> itself and then undone, so the score only
+        has to be worked out again for the Blocks the move changed. Every
+        smash starts from the same random numbers, which are taken back
+        afterwards, so that the score of a move does not depend on the moves
+        scored before it and scoring does not change the rest of the game.
+
+        If <floor> is not None, the moves are ranked by an upper bound on their
+        score (see Goal.upper_bound) and tried from the highest bound down. A
+        move is not made if its bound is at most <floor>, or if it cannot beat
+        the best score found so far without coming before it in <moves>, and
+        its bound is given instead of its score. Such moves are counted in
+        <moves_pruned>. This does not change which move is the first with the
+        highest score, if that score is more than <floor>.
+        """
+        state = random.getstate()
+        score = [0] * len(moves)
+        order = range(len(moves))
+        bounds = None
+        if floor is not None:
+            bounds = [self.goal.upper_bound(board, move[2],
+                                            (move[0], move[1]))
+                      for move in moves]
+            order = sorted(order, key=lambda i: -bounds[i])
+        best, first = floor, -1
+        for i in order:
+            if bounds is not None and \
+                    (bounds[i] < best or bounds[i] == best and i > first):
+                score[i] = bounds[i]
+                self.moves_pruned += 1
+                continue
+            move = moves[i]
+            if move[0] == SMASH[0]:
+                random.setstate(state)
+            change = move[2].perform((move[0], move[1]), self.goal.colour)
+            score[i] = self.goal.score(board)
+            change.undo()
+            if bounds is not None and \
+                    (score[i] > best or score[i] == best and i < first):
+                best, first = score[i], i
+        random.setstate(state)
+        return score
+
+    def _score_parallel(self, board: Block,
+                        moves: List[Tuple[str, Optional[int], Block]]) \
+            -> List[int]:
+        """Return the score for this player's goal after each of <moves> is
+        made on <board>, splitting the moves evenly between the workers.
+
+        One seed is taken from the random module for each move.
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self._workers)
+        data = board.encode()
+        candidates = [(board.path_to(move[2]), (move[0], move[1]),
+                       random.getrandbits(32)) for move in moves]
+        size = max(1, math.ceil(len(candidates) / self._workers))
+        futures = [self._pool.submit(_score_candidates, data, self.goal,
+                                     candidates[i:i + size])
+                   for i in range(0, len(candidates), size)]
+        score = []
+        for future in futures:
+            score.extend(future.result())
+        return score
+
+    def close(self) -> None:
+        """Stop this player's worker processes, if they were started. They
+        are started again if this player makes another move.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class _OutOfTime(Exception):
+    """Raised when a SearchPlayer has used up its time for a move."""
+
+
+class SearchPlayer(Player):
+    """A computer player that looks ahead over the next few turns, in the
+    order the players take them.
+
+    A position is worth this player's score minus the best score among the
+    other players, where each score is a player's goal score minus the
+    penalties for the moves made while looking ahead. This player picks the
+    move that is best for it, assuming every other player picks the move
+    that is worst for it. With expectimax, every other player is instead
+    assumed to pick any of their valid moves (or PASS) with equal chance.
+
+    The player looks one turn ahead, then two, and so on until it runs out of
+    time or reaches its maximum depth, and plays the best move from the
+    deepest search it finished.
+
+    === Public Attributes ===
+    depth_reached:
+        The number of turns looked ahead by the deepest search finished while
+        choosing the most recent move, or 0 if none has been finished yet.
+    """
+    # === Private Attributes ===
+    # _proceed:
+    #   True when the player should make a move, False when the player should
+    #   wait.
+    # _level:
+    #   The level of the Block that the user selected most recently.
+    # _goals:
+    #   The goal of every player in the game, indexed by player ID. Players
+    #   take turns in the order of their IDs.
+    # _budget:
+    #   The number of seconds this player may take to choose a move.
+    # _max_depth:
+    #   The greatest number of turns to look ahead.
+    # _expectimax:
+    #   True if other players are assumed to move at random.
+    # _deadline:
+    #   The time.perf_counter() value by which the current search must end.
+    #
+    # == Representation Invariants concerning the private attributes ==
+    #     _goals[id] is goal
+    #     _budget > 0
+    #     _max_depth >= 1
+    depth_reached: int
+    _proceed: bool
+    _level: int
+    _goals: List[Goal]
+    _budget: float
+    _max_depth: int
+    _expectimax: bool
+    _deadline: float
+
+    def __init__(self, player_id: int, goals: List[Goal],
+                 budget: float = 1.0, max_depth: int = 3,
+                 expectimax: bool = False) -> None:
+        """Initialize a search player with the given player_id, where <goals>
+        has the goal of every player in the game indexed by player ID.
+
+        The player takes at most about <budget> seconds to choose a move, and
+        looks at most <max_depth> turns ahead.
+        """
+        super().__init__(player_id, goals[player_id])
+        self._level = 0
+        self._proceed = False
+        self._goals = goals
+        self._budget = budget
+        self._max_depth = max_depth
+        self._expectimax = expectimax
+        self._deadline = 0.0
+        self.depth_reached = 0
+
+    def get_selected_block(self, board: Block) -> Optional[Block]:
+        """Return the selected block for the move"""
+        return None
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        """Respond to relevant event when mouse is clicked"""
+        if _controls().is_proceed(event):
+            self.proceed()
+
+    def proceed(self) -> None:
+        """Make the next move without waiting for a mouse click"""
+        self._proceed = True
+
+    def generate_move(self, board: Block) -> \
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return the move that is best for this player, looking as many turns
+        ahead as the time budget allows. This may be PASS.
+
+        This function does not mutate <board>.
+        """
+        if not self._proceed:
+            return None  # Do not remove
+
+        self._deadline = time.perf_counter() + self._budget
+        state = random.getstate()
+        moves = self._moves(board, self.id)
+        best = moves[0]
+        self.depth_reached = 0
+        try:
+            for depth in range(1, self._max_depth + 1):
+                values = {}
+                try:
+                    self._search_root(board, moves, depth, values)
+                finally:
+                    if depth == 1 and values:
+                        # Even an unfinished one turn search has exact values
+                        # for the moves it got to
+                        best = max(moves[:len(values)],
+                                   key=lambda m: values[id(m)])
+                # Look at the best moves first in the next, deeper, search
+                moves.sort(key=lambda m: values[id(m)], reverse=True)
+                best = moves[0]
+                self.depth_reached = depth
+        except _OutOfTime:
+            pass
+        finally:
+            random.setstate(state)
+
+        self._proceed = False  # Must set to False before returning!
+        return best
+
+    def _moves(self, board: Block, player_id: int) \
+            -> List[Tuple[str, Optional[int], Block]]:
+        """Return PASS followed by every valid move the player with
+        <player_id> can make on <board>.
+        """
+        moves = [_create_move(PASS, board)]
+        moves.extend(legal_moves(board, self._goals[player_id].colour))
+        return moves
+
+    def _search_root(self, board: Block,
+                     moves: List[Tuple[str, Optional[int], Block]],
+                     depth: int, values: Dict[int, float]) -> None:
+        """Record in <values> how much each of <moves> is worth to this player
+        when looking <depth> turns ahead, keyed by the id of the move.
+
+        Moves are searched in order. A move that cannot beat the best move
+        before it may be given a value lower than its real one.
+        """
+        penalties = [0] * len(self._goals)
+        alpha = float('-inf')
+        for move in moves:
+            value = self._try(board, move, self.id, depth, penalties, alpha,
+                              float('inf'))
+            values[id(move)] = value
+            alpha = max(alpha, value)
+
+    def _try(self, board: Block, move: Tuple[str, Optional[int], Block],
+             player_id: int, depth: int, penalties: List[int], alpha: float,
+             beta: float) -> float:
+        """Return the value of the position after the player with <player_id>
+        makes <move> on <board>, looking <depth> turns ahead counting this one.
+
+        <move> is made on <board> itself and undone before returning, even if
+        the player runs out of time.
+        """
+        action = (move[0], move[1])
+        change = None
+        if action != PASS:
+            change = move[2].perform(action, self._goals[player_id].colour)
+        penalties[player_id] += ACTION_PENALTY[action]
+        try:
+            return self._search(board, (player_id + 1) % len(self._goals),
+                                depth - 1, penalties, alpha, beta)
+        finally:
+            penalties[player_id] -= ACTION_PENALTY[action]
+            if change is not None:
+                change.undo()
+
+    def _search(self, board: Block, player_id: int, depth: int,
+                penalties: List[int], alpha: float, beta: float) -> float:
+        """Return the value of <board> to this player when it is the turn of
+        the player with <player_id>, looking <depth> turns ahead.
+
+        Stop looking at moves once the value is known to be at most <alpha> or
+        at least <beta>, since then it cannot change the move that is played.
+
+        Raise _OutOfTime if the deadline for this move has passed.
+        """
+        if time.perf_counter() > self._deadline:
+            raise _OutOfTime
+        if depth == 0:
+            return self._evaluate(board, penalties)
+
+        moves = self._moves(board, player_id)
+        if player_id == self.id:
+            best = float('-inf')
+            for move in moves:
+                best = max(best, self._try(board, move, player_id, depth,
+                                           penalties, alpha, beta))
+                alpha = max(alpha, best)
+                if alpha >= beta:
+                    break
+            return best
+        elif self._expectimax:
+            total = 0.0
+            for move in moves:
+                total += self._try(board, move, player_id, depth, penalties,
+                                   float('-inf'), float('inf'))
+            return total / len(moves)
+        else:
+            best = float('inf')
+            for move in moves:
+                best = min(best, self._try(board, move, player_id, depth,
+                                           penalties, alpha, beta))
+                beta = min(beta, best)
+                if alpha >= beta:
+                    break
+            return best
+
+    def _evaluate(self, board: Block, penalties: List[int]) -> float:
+        """Return the value of <board> to this player, given the <penalties>
+        each player has picked up while looking ahead.
+        """
+        scores = [goal.score(board) - penalties[i]
+                  for i, goal in enumerate(self._goals)]
+        mine = scores.pop(self.id)
+        if not scores:
+            return mine
+        return mine - max(scores)
+
+
+class _Node:
+    """A position in the game tree searched by MonteCarloPlayer.
+
+    === Public Attributes ===
+    move:
+        The move made to reach this position, or None for the root.
+    change:
+        The change <move> made to the board, which is None for the root and
+        for a pass. Redoing it moves from the parent position to this one.
+    player:
+        The ID of the player who made <move>, or None for the root.
+    turn:
+        The ID of the player whose turn it is in this position.
+    children:
+        The positions reached by the moves tried so far from this one.
+    untried:
+        The valid moves from this position that have not been tried yet, or
+        None if they have not been listed yet.
+    visits:
+        The number of rollouts made through this position.
+    wins:
+        The total reward to <player> of those rollouts.
+    """
+    move: Optional[Tuple[str, Optional[int], Block]]
+    change: Optional[BlockChange]
+    player: Optional[int]
+    turn: int
+    children: List[_Node]
+    untried: Optional[List[Tuple[str, Optional[int], Block]]]
+    visits: int
+    wins: float
+
+    def __init__(self, move: Optional[Tuple[str, Optional[int], Block]],
+                 change: Optional[BlockChange], player: Optional[int],
+                 turn: int) -> None:
+        """Initialize a position that has not been visited yet."""
+        self.move = move
+        self.change = change
+        self.player = player
+        self.turn = turn
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+    def select(self, exploration: float) -> _Node:
+        """Return the child of this position with the highest upper confidence
+        bound (UCT), where <exploration> weighs how little a child has been
+        visited against how well it has done.
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children,
+                   key=lambda c: c.wins / c.visits +
+                   exploration * math.sqrt(log_visits / c.visits))
+
+
+class MonteCarloPlayer(Player):
+    """A computer player that chooses moves by Monte Carlo tree search.
+
+    Each iteration of the search walks down the tree of moves tried so far,
+    picking moves by their upper confidence bound, tries one new move, and
+    then plays a few random moves for each player in turn, the way a
+    RandomPlayer would. The rollout is a win for the players with the highest
+    score after it, where a score is a goal score minus the penalties for the
+    moves made during the iteration. With no other players, a rollout is a
+    win if this player's score is higher than when the search started.
+
+    The player plays the move it tried most often, or PASS if it had no time
+    to try any.
+
+    === Public Attributes ===
+    iterations_per_second:
+        The number of iterations per second of the search for the most recent
+        move, or 0.0 if no search has been done yet.
+    """
+    # === Private Attributes ===
+    # _proceed:
+    #   True when the player should make a move, False when the player should
+    #   wait.
+    # _level:
+    #   The level of the Block that the user selected most recently.
+    # _goals:
+    #   The goal of every player in the game, indexed by player ID. Players
+    #   take turns in the order of their IDs.
+    # _iterations:
+    #   The greatest number of iterations per move, or None if there is no
+    #   limit.
+    # _budget_ms:
+    #   The greatest number of milliseconds to search for per move, or None if
+    #   there is no limit.
+    # _rollout_turns:
+    #   The number of random moves played after the new move in an iteration.
+    # _exploration:
+    #   The weight of exploration in the upper confidence bound.
+    #
+    # == Representation Invariants concerning the private attributes ==
+    #     _goals[id] is goal
+    #     _iterations is not None or _budget_ms is not None
+    #     _rollout_turns >= 0
+    iterations_per_second: float
+    _proceed: bool
+    _level: int
+    _goals: List[Goal]
+    _iterations: Optional[int]
+    _budget_ms: Optional[float]
+    _rollout_turns: int
+    _exploration: float
+
+    def __init__(self, player_id: int, goals: List[Goal],
+                 iterations: Optional[int] = None,
+                 budget_ms: Optional[float] = None, rollout_turns: int = 4,
+                 exploration: float = math.sqrt(2)) -> None:
+        """Initialize a Monte Carlo player with the given player_id, where
+        <goals> has the goal of every player in the game indexed by player ID.
+
+        The search for a move stops after <iterations> iterations or after
+        <budget_ms> milliseconds, whichever comes first.
+
+        Precondition:
+            - iterations is not None or budget_ms is not None
+        """
+        super().__init__(player_id, goals[player_id])
+        self._level = 0
+        self._proceed = False
+        self._goals = goals
+        self._iterations = iterations
+        self._budget_ms = budget_ms
+        self._rollout_turns = rollout_turns
+        self._exploration = exploration
+        self.iterations_per_second = 0.0
+
+    def get_selected_block(self, board: Block) -> Optional[Block]:
+        """Return the selected block for the move"""
+        return None
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        """Respond to relevant event when mouse is clicked"""
+        if _controls().is_proceed(event):
+            self.proceed()
+
+    def proceed(self) -> None:
+        """Make the next move without waiting for a mouse click"""
+        self._proceed = True
+
+    def generate_move(self, board: Block) -> \
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return the move tried most often by a Monte Carlo tree search from
+        <board>. This may be PASS.
+
+        This function does not mutate <board>.
+        """
+        if not self._proceed:
+            return None  # Do not remove
+
+        start = time.perf_counter()
+        deadline = float('inf')
+        if self._budget_ms is not None:
+            deadline = start + self._budget_ms / 1000
+        state = random.getstate()
+        root = _Node(None, None, None, self.id)
+        start_score = self.goal.score(board)
+        iterations = 0
+        while (self._iterations is None or iterations < self._iterations) \
+                and time.perf_counter() < deadline:
+            self._iterate(board, root, start_score)
+            iterations += 1
+        random.setstate(state)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.iterations_per_second = iterations / elapsed
+
+        self._proceed = False  # Must set to False before returning!
+        if not root.children:
+            return _create_move(PASS, board)
+        return max(root.children, key=lambda c: c.visits).move
+
+    def _moves(self, board: Block, player_id: int) \
+            -> List[Tuple[str, Optional[int], Block]]:
+        """Return PASS followed by every valid move the player with
+        <player_id> can make on <board>.
+        """
+        moves = [_create_move(PASS, board)]
+        moves.extend(legal_moves(board, self._goals[player_id].colour))
+        return moves
+
+    def _iterate(self, board: Block, root: _Node, start_score: int) -> None:
+        """Do one iteration of the search from <root>, the position of
+        <board>, and leave <board> as it was.
+
+        <start_score> is this player's score on <board>.
+        """
+        penalties = [0] * len(self._goals)
+        changes = []
+        path = [root]
+        node = root
+
+        # Walk down the moves tried so far, redoing their changes so that the
+        # moves below them still refer to the Blocks on the board
+        while True:
+            if node.untried is None:
+                node.untried = self._moves(board, node.turn)
+            if node.untried or not node.children:
+                break
+            node = node.select(self._exploration)
+            if node.change is not None:
+                node.change.redo()
+                changes.append(node.change)
+            penalties[node.player] += ACTION_PENALTY[node.move[:2]]
+            path.append(node)
+
+        if node.untried:
+            move = node.untried.pop(random.randrange(len(node.untried)))
+            change = self._make(move, node.turn, penalties)
+            if change is not None:
+                changes.append(change)
+            turn = (node.turn + 1) % len(self._goals)
+            child = _Node(move, change, node.turn, turn)
+            node.children.append(child)
+            path.append(child)
+            node = child
+
+        turn = node.turn
+        for _ in range(self._rollout_turns):
+            moves = list(legal_moves(board, self._goals[turn].colour))
+            if moves:
+                change = self._make(random.choice(moves), turn, penalties)
+                changes.append(change)
+            turn = (turn + 1) % len(self._goals)
+
+        rewards = self._rewards(board, penalties, start_score)
+        for change in reversed(changes):
+            change.undo()
+        for node in path:
+            node.visits += 1
+            if node.player is not None:
+                node.wins += rewards[node.player]
+
+    def _make(self, move: Tuple[str, Optional[int], Block], player_id: int,
+              penalties: List[int]) -> Optional[BlockChange]:
+        """Make <move> on the board for the player with <player_id>, adding
+        its penalty to <penalties>, and return the change it made.
+        """
+        action = (move[0], move[1])
+        penalties[player_id] += ACTION_PENALTY[action]
+        if action == PASS:
+            return None
+        return move[2].perform(action, self._goals[player_id].colour)
+
+    def _rewards(self, board: Block, penalties: List[int],
+                 start_score: int) -> List[float]:
+        """Return the reward to each player, indexed by player ID, for the
+        rollout that ended with <board> and <penalties>.
+
+        The players with the highest score share a reward of 1. With no other
+        players, this player gets 1 if its score beats <start_score>, 0.5 if
+        it ties and 0 otherwise.
+        """
+        scores = [goal.score(board) - penalties[i]
+                  for i, goal in enumerate(self._goals)]
+        if len(scores) == 1:
+            if scores[0] == start_score:
+                return [0.5]
+            return [1.0 if scores[0] > start_score else 0.0]
+        best = max(scores)
+        winners = scores.count(best)
+        return [1 / winners if score == best else 0.0 for score in scores]
+
 
 if __name__ == '__main__':
     import python_ta
@@ -395,7 +1226,8 @@ if __name__ == '__main__':
         'allowed-io': ['process_event'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'actions', 'block',
-            'goal', 'pygame', '__future__'
+            'goal', 'pygame', '__future__', 'time', 'math',
+            'concurrent.futures', 'controls', 'settings', 'functools'
         ],
         'max-attributes': 10,
         'generated-members': 'pygame.*'
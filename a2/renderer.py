@@ -21,18 +21,23 @@ Misha Schwartz, and Jaisie Sin.
 
 This file contains the class that "renders" the image of our game.
 """
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Set, Tuple, Optional
+from collections import OrderedDict
 import pygame
 
+from block import Block, CHILD_OFFSETS, cell_start
 from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,\
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, ACTION_KEY, ACTION_LABEL, COMBINE,\
-    PAINT, PASS
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, ACTION_LABEL, COMBINE, PAINT, PASS
+from controls import ACTION_KEY, LEVEL_UP_KEY, LEVEL_DOWN_KEY
 from settings import BACKGROUND_COLOUR, TEXT_COLOUR, OUTLINE_THICKNESS, \
     OUTLINE_COLOUR, HIGHLIGHT_THICKNESS, HIGHLIGHT_COLOUR, COLOUR_LIST, \
     colour_name
 
 Y_FONT_PADDING = 2
 
+# The greatest number of scaled action images kept by a Renderer
+SCALED_IMAGE_LIMIT = 32
+
 
 def _load_image(path_to_file: str) -> pygame.Surface:
     """
@@ -69,10 +74,10 @@ def _print_human_instructions(x: int, y: int, text_height: int,
     x += 10
     y += text_height + Y_FONT_PADDING
 
-    text = 'Increase Level: S'
+    text = f'Increase Level: {pygame.key.name(LEVEL_DOWN_KEY).upper()}'
     _print_to_image(text, x, y, font, image)
     y += text_height + Y_FONT_PADDING
-    text = 'Decrease Level: W'
+    text = f'Decrease Level: {pygame.key.name(LEVEL_UP_KEY).upper()}'
     _print_to_image(text, x, y, font, image)
     y += text_height + Y_FONT_PADDING
 
@@ -139,9 +144,102 @@ def _print_instructions(screen: pygame.Surface,
     return image
 
 
+class _DirtyCells:
+    """An observer of a board that remembers which parts of it have changed.
+
+    Each part is a square of unit cells, the column and row of its upper left
+    unit cell and its level, as in Block.add_observer.
+    """
+    # === Private Attributes ===
+    # _squares:
+    #   The squares that have changed since they were last taken.
+    _squares: Set[Tuple[int, int, int]]
+
+    def __init__(self) -> None:
+        """Initialize an observer that has not seen any change."""
+        self._squares = set()
+
+    def block_changed(self, block: Block, x: int, y: int) -> None:
+        """Remember that the unit cells covered by <block>, whose upper left
+        unit cell is at column <x> and row <y>, have changed.
+        """
+        self._squares.add((x, y, block.level))
+
+    def take(self, board: Block, limit: int) -> List[Tuple[int, int, int,
+                                                           int]]:
+        """Return the rectangles, in pixels, of the parts of <board> that
+        changed since the last call, and forget them.
+
+        A part inside another part that changed is left out. If there would be
+        more than <limit> rectangles, return one that covers all of <board>
+        instead.
+        """
+        rects = []
+        for x, y, level in self._squares:
+            if not any(self._covered(x, y, level, above, board.max_depth)
+                       for above in range(level)):
+                rects.append(_pixel_rect(board, x, y, level))
+        self._squares = set()
+        if len(rects) > limit:
+            x, y = board.position
+            return [(x, y, board.size, board.size)]
+        return rects
+
+    def _covered(self, x: int, y: int, level: int, above: int,
+                 max_depth: int) -> bool:
+        """Return True iff the square at <level> with its upper left unit cell
+        at column <x> and row <y> is inside a changed square at level <above>.
+        """
+        shift = max_depth - above
+        return (x >> shift << shift, y >> shift << shift, above) in \
+            self._squares
+
+
+def _pixel_rect(board: Block, x: int, y: int, level: int) \
+        -> Tuple[int, int, int, int]:
+    """Return the rectangle in pixels of the Block of <board> at <level>
+    whose upper left unit cell is at column <x> and row <y>, whether or not
+    <board> has been smashed that far.
+
+    The rectangle is the x, y, width and height.
+    """
+    left, top = board.position
+    size = board.size
+    depth = level - board.level
+    shift = board.max_depth - level
+    return _cell_rect(left, top, size, depth, x >> shift, y >> shift)
+
+
+def _cell_rect(left: int, top: int, size: int, depth: int, column: int,
+               row: int) -> Tuple[int, int, int, int]:
+    """Return the rectangle in pixels of the cell in <column> and <row> among
+    the cells <depth> levels below a board whose upper left corner is at
+    <left> and <top>, and with <size>.
+
+    The rectangle is the x, y, width and height. The cells at each depth cover
+    the board exactly, so the rectangle may be a pixel narrower or shorter than
+    the size of the Blocks at that depth.
+    """
+    x = cell_start(left, size, depth, column)
+    y = cell_start(top, size, depth, row)
+    return (x, y, cell_start(left, size, depth, column + 1) - x,
+            cell_start(top, size, depth, row + 1) - y)
+
+
 class Renderer:
     """
     A class designed to handle drawing the different aspects of a Blocky game.
+
+    The board is drawn by draw_blocks onto a surface of its own, which is kept
+    between frames. Only the parts of the board that changed since it was last
+    drawn are drawn again, and only the parts of the screen that were drawn on
+    are updated by update_display.
+
+    === Public Attributes ===
+    image_hits:
+        The number of times draw_image found the scaled image it needed.
+    image_misses:
+        The number of times draw_image had to scale an image.
     """
     # === Private Attributes ===
     # _screen:
@@ -152,12 +250,44 @@ class Renderer:
     #   A dictionary mapping actions to images that are displayed in the game.
     # _status_position:
     #   The (x, y) position of the status messages.
+    # _board_surface:
+    #   The board as it was last drawn by draw_blocks.
+    # _board:
+    #   The board drawn onto _board_surface, or None if there is none yet.
+    # _dirty:
+    #   The observer of <_board> that remembers which parts of it changed.
+    # _overlays:
+    #   The rectangles of the screen drawn over the board since it was last
+    #   copied to the screen.
+    # _updated:
+    #   The rectangles of the screen drawn on since the display was last
+    #   updated.
+    # _screen_stale:
+    #   True if the board on the screen may not match _board_surface at all.
+    # _tiles:
+    #   The image of an outlined rectangle of each colour, width and height
+    #   drawn so far.
+    # _scaled:
+    #   The images of actions scaled to a size, keyed by action and size, from
+    #   the least to the most recently used. There are at most
+    #   SCALED_IMAGE_LIMIT of them.
+    image_hits: int
+    image_misses: int
     _screen: pygame.Surface
     _instructions: pygame.Surface
     _images: Dict[Tuple[str, Optional[int]], pygame.Surface]
     _font: pygame.font.Font
     _status_position: Tuple[int, int]
     _clear_rect: Tuple[Tuple[int, int], Tuple[int, int]]
+    _status_rect: Tuple[int, int, int, int]
+    _board_surface: pygame.Surface
+    _board: Optional[Block]
+    _dirty: Optional[_DirtyCells]
+    _overlays: List[Tuple[int, int, int, int]]
+    _updated: List[Tuple[int, int, int, int]]
+    _screen_stale: bool
+    _tiles: Dict[Tuple[Tuple[int, int, int], int, int], pygame.Surface]
+    _scaled: Dict[Tuple[Tuple[str, Optional[int]], int], pygame.Surface]
 
     def __init__(self, size: int) -> None:
         """Initialize this Renderer for a board with dimensions <size> x <size>.
@@ -175,6 +305,18 @@ class Renderer:
 
         self._status_position = (10, size + Y_FONT_PADDING)
         self._clear_rect = ((0, 0), (size, height))
+        self._status_rect = (0, size, size, height - size)
+
+        self._board_surface = pygame.Surface((size, size))
+        self._board = None
+        self._dirty = None
+        self._overlays = []
+        self._updated = [(0, 0, width, height)]
+        self._screen_stale = True
+        self._tiles = {}
+        self._scaled = OrderedDict()
+        self.image_hits = 0
+        self.image_misses = 0
 
         self._images = {
             ROTATE_CLOCKWISE: _load_image('images/rotate-cw.png'),
@@ -191,6 +333,14 @@ class Renderer:
         """Clear the screen with BACKGROUND_COLOUR.
         """
         self._screen.fill(BACKGROUND_COLOUR, self._clear_rect)
+        self._updated.append(self._clear_rect[0] + self._clear_rect[1])
+        self._screen_stale = True
+
+    def update_display(self) -> None:
+        """Show the parts of the screen drawn on since the last call."""
+        if self._updated:
+            pygame.display.update(self._updated)
+            self._updated = []
 
     def draw_image(self, action: Tuple[str, Optional[int]],
                    pos: Tuple[int, int], size: int) -> None:
@@ -200,19 +350,110 @@ class Renderer:
         If the action is not supported, no image is drawn.
         """
         if action in self._images:
-            image = self._images[action]
-            image = pygame.transform.scale(image, (size, size))
+            key = (action, size)
+            if key in self._scaled:
+                self.image_hits += 1
+                self._scaled.move_to_end(key)
+            else:
+                self.image_misses += 1
+                # Converting to the format of the screen makes blitting faster
+                self._scaled[key] = pygame.transform.scale(
+                    self._images[action], (size, size)).convert_alpha()
+                if len(self._scaled) > SCALED_IMAGE_LIMIT:
+                    self._scaled.popitem(last=False)
+            image = self._scaled[key]
             self._screen.blit(image, pos)
+            self._drawn_over((pos[0], pos[1], size, size))
 
     def draw_board(self, squares: List[Tuple[Tuple[int, int, int],
                                              Tuple[int, int], int]]) -> None:
         """Draw each block in blocks onto the screen.
         """
-        for colour, pos, size in squares:
-            rect = (pos[0], pos[1], size, size)
-            pygame.draw.rect(self._screen, colour, rect, 0)
-            pygame.draw.rect(self._screen, OUTLINE_COLOUR, rect,
-                             OUTLINE_THICKNESS)
+        self._screen.blits([(self._tile(colour, size, size), pos)
+                            for colour, pos, size in squares], False)
+        self._updated.append(self._clear_rect[0] + self._clear_rect[1])
+        self._screen_stale = True
+
+    def draw_blocks(self, board: Block, refresh: bool = True) -> None:
+        """Draw <board> onto the screen.
+
+        Only the parts of <board> that changed since it was last drawn are
+        drawn again. If <refresh> is False, <board> is drawn as it was the
+        last time instead, as long as it has been drawn before.
+        """
+        if board is not self._board or self._dirty is None:
+            if self._board is not None:
+                self._board.remove_observer(self._dirty)
+            self._board = board
+            self._dirty = _DirtyCells()
+            board.add_observer(self._dirty)
+            x, y = board.position
+            rects = [(x, y, board.size, board.size)]
+        elif refresh:
+            rects = self._dirty.take(board, 64)
+        else:
+            rects = []
+
+        for rect in rects:
+            self._draw_region(board, rect)
+        if self._screen_stale:
+            rects = [(0, 0) + self._board_surface.get_size()]
+            self._screen_stale = False
+        for rect in rects + self._overlays:
+            self._screen.blit(self._board_surface, rect[:2], rect)
+            self._updated.append(rect)
+        self._overlays = []
+
+    def _draw_region(self, board: Block,
+                     rect: Tuple[int, int, int, int]) -> None:
+        """Draw the part of <board> inside <rect> onto the board surface.
+
+        Each leaf is drawn over exactly the rectangle of its cell (see
+        Block.cell), so no two leaves overlap.
+        """
+        surface = self._board_surface
+        surface.set_clip(rect)
+        surface.fill(BACKGROUND_COLOUR, rect)
+        area = pygame.Rect(rect)
+        left, top = board.position
+        size = board.size
+        tiles = []
+        blocks = [(board, 0, 0, 0)]
+        while blocks:
+            block, depth, column, row = blocks.pop()
+            cell = _cell_rect(left, top, size, depth, column, row)
+            if not area.colliderect(cell):
+                continue
+            if len(block.children) == 0:
+                tiles.append((self._tile(block.colour, cell[2], cell[3]),
+                              cell[:2]))
+            else:
+                for i in range(len(block.children)):
+                    blocks.append((block.children[i], depth + 1,
+                                   2 * column + CHILD_OFFSETS[i][0],
+                                   2 * row + CHILD_OFFSETS[i][1]))
+        surface.blits(tiles, False)
+        surface.set_clip(None)
+
+    def _tile(self, colour: Tuple[int, int, int], width: int, height: int) \
+            -> pygame.Surface:
+        """Return the image of a rectangle of <colour> that is <width> by
+        <height> pixels and has an outline, drawing it the first time it is
+        asked for.
+        """
+        key = (colour, width, height)
+        if key not in self._tiles:
+            tile = pygame.Surface((width, height))
+            rect = (0, 0, width, height)
+            pygame.draw.rect(tile, colour, rect, 0)
+            pygame.draw.rect(tile, OUTLINE_COLOUR, rect, OUTLINE_THICKNESS)
+            self._tiles[key] = tile
+        return self._tiles[key]
+
+    def _drawn_over(self, rect: Tuple[int, int, int, int]) -> None:
+        """Remember that <rect> of the screen was drawn over the board."""
+        self._overlays.append(rect)
+        self._updated.append(rect)
 
     def highlight_block(self, pos: Tuple[int, int], size: int) -> None:
         """Draw a highlighted square border at pos with size.
@@ -220,6 +461,7 @@ class Renderer:
         rect = (pos[0], pos[1], size, size)
         pygame.draw.rect(self._screen, HIGHLIGHT_COLOUR, rect,
                          HIGHLIGHT_THICKNESS)
+        self._drawn_over(rect)
 
     def text_height(self) -> int:
         """Return the height between lines of text in pixels.
@@ -230,12 +472,16 @@ class Renderer:
         """Print <text> to the (<x>, <y>) location on the screen.
         """
         _print_to_image(text, x, y, self._font, self._screen)
+        width, height = self._font.size(text)
+        self._drawn_over((x, y, width, height))
 
     def draw_status(self, message: str) -> None:
         """Draw the current status of the game.
         """
+        self._screen.fill(BACKGROUND_COLOUR, self._status_rect)
         surface = self._font.render(message, 1, TEXT_COLOUR)
         self._screen.blit(surface, self._status_position)
+        self._updated.append(self._status_rect)
 
     def save_to_file(self, filename: str) -> None:
         """Save the current graphics on the screen to a file named <filename>.
@@ -39,6 +39,12 @@ COLOUR_LIST = [PACIFIC_POINT, REAL_RED, OLD_OLIVE, DAFFODIL_DELIGHT]
 # The game board will be a square with this size.
 BOARD_SIZE = 750
 
+# The largest max_depth a board can have, which makes a board of 1024 by 1024
+# unit cells. Goals and moves work on unit cells, not pixels, so a board this
+# deep still scores quickly even though its smallest Blocks are drawn smaller
+# than a pixel.
+MAX_DEPTH = 10
+
 # The background will be this colour.
 BACKGROUND_COLOUR = BLACK
 # Text will have this colour.
@@ -0,0 +1,93 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains a headless version of the Blocky game, which plays games
+between computer players with no display, event loop or animation.
+"""
+from __future__ import annotations
+from typing import List, Optional, Tuple
+import random
+
+from block import generate_board
+from blocky import GameData
+from player import Player
+from settings import BOARD_SIZE
+
+
+def simulate(max_depth: int, players: List[Player], turns: int,
+             seed: Optional[int] = None) \
+        -> Tuple[List[Tuple[int, int, int]],
+                 List[Tuple[int, Tuple[str, Optional[int]], List[int]]]]:
+    """Play a game of <turns> turns between <players> on a new board with a
+    depth of <max_depth>, and return the final scores and the log of moves.
+
+    If <seed> is not None, the random module is seeded with it first, so the
+    same seed and players always play the same game.
+
+    The scores are a tuple of each player's ID, goal score and penalty, as
+    shown at the end of a game. The log has a tuple of the player ID, the
+    action, and the path from the board to the Block acted on (see
+    Block.path_to) for every move, in the order the moves were made.
+
+    Every player is closed at the end of the game (see Player.close).
+
+    Raise a ValueError if a player does not make a valid move when asked to.
+
+    Preconditions:
+        - len(players) >= 1
+        - players[i].id == i for every player
+        - every player is a computer player
+    """
+    if seed is not None:
+        random.seed(seed)
+    board = generate_board(max_depth, BOARD_SIZE)
+    data = GameData(board, players)
+    data.max_turns = turns
+
+    log = []
+    try:
+        for _ in range(turns):
+            for player in players:
+                player.proceed()
+                move = player.generate_move(board)
+                if move is None:
+                    raise ValueError(f'Player {player.id} did not make a move')
+                path = board.path_to(move[2])
+                if data.apply(move, player.id) is None:
+                    raise ValueError(
+                        f'Player {player.id} made an invalid move')
+                log.append((player.id, (move[0], move[1]), path))
+    finally:
+        for player in players:
+            player.close()
+
+    return data.scoreboard(), log
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing', '__future__',
+            'block', 'blocky', 'player', 'settings'
+        ]
+    })
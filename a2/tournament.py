@@ -0,0 +1,227 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains a tournament runner for the computer players of Blocky.
+Every pairing of the given kinds of player plays a number of seeded games,
+which are spread over a pool of worker processes. The result of each game is
+written to a CSV file, and the win rate of each kind of player is reported at
+the end.
+
+For example, to play 50 games between each pair of a RandomPlayer and
+SmartPlayers of difficulty 5 and 50:
+
+    python tournament.py random smart:5 smart:50 --games 50
+
+A kind of player is written as one of:
+    random           a RandomPlayer
+    smart:D          a SmartPlayer of difficulty D
+    search:D         a SearchPlayer that looks D turns ahead
+    mcts:N           a MonteCarloPlayer that runs N iterations per move
+
+None of these players has a time limit, since a player that stops searching
+when its time runs out may choose a different move each time a game is
+played. So playing a game again with the same seed plays the same game.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import itertools
+import math
+import os
+import random
+import time
+
+from goal import Goal, generate_goals
+from player import Player, RandomPlayer, SmartPlayer, SearchPlayer, \
+    MonteCarloPlayer
+from settings import MAX_DEPTH
+from simulation import simulate
+
+# The columns of the results file. The last four are repeated for each seat.
+SEAT_COLUMNS = ['player', 'score', 'penalty', 'moves']
+
+
+def create_player(kind: str, player_id: int, goals: List[Goal]) -> Player:
+    """Return a new player of the <kind> described in this module's
+    description, with <player_id> and the goal goals[player_id].
+
+    Raise a ValueError if <kind> is not a kind of player, which includes a
+    number in <kind> that is not positive.
+    """
+    name, _, value = kind.partition(':')
+    if name == 'random' and not value:
+        return RandomPlayer(player_id, goals[player_id])
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number > 0:
+        if name == 'smart':
+            return SmartPlayer(player_id, goals[player_id], number)
+        elif name == 'search':
+            return SearchPlayer(player_id, goals, math.inf, number)
+        elif name == 'mcts':
+            return MonteCarloPlayer(player_id, goals, number)
+    raise ValueError(f'{kind} is not a kind of player')
+
+
+def play_game(max_depth: int, kinds: List[str], turns: int, seed: int) \
+        -> List[Tuple[str, int, int, int]]:
+    """Play the game with <seed> between players of <kinds>, in that order,
+    for <turns> turns on a board with a depth of <max_depth>.
+
+    Return each player's kind, goal score, penalty, and number of moves other
+    than PASS.
+
+    Precondition:
+        - 2 <= max_depth <= MAX_DEPTH
+    """
+    random.seed(seed)
+    goals = generate_goals(len(kinds))
+    players = [create_player(kind, i, goals) for i, kind in enumerate(kinds)]
+    scores, log = simulate(max_depth, players, turns)
+    result = []
+    for (player_id, goal_score, penalty), kind in zip(scores, kinds):
+        moves = sum(1 for entry in log
+                    if entry[0] == player_id and entry[1][0] != 'pass')
+        result.append((kind, goal_score, penalty, moves))
+    return result
+
+
+def _play(task: Tuple[int, List[str], int, int]) \
+        -> List[Tuple[str, int, int, int]]:
+    """Play the game described by <task>, which holds the arguments to
+    play_game. This is run by the worker processes.
+    """
+    return play_game(*task)
+
+
+def run_tournament(kinds: List[str], games: int, max_depth: int, turns: int,
+                   workers: Optional[int] = None, first_seed: int = 0) \
+        -> List[Tuple[int, List[Tuple[str, int, int, int]]]]:
+    """Play <games> games for every pair of <kinds>, and return the seed and
+    result of each game as returned by play_game.
+
+    The games of a pair have the seeds first_seed, first_seed + 1, ... and
+    the players swap seats from one seed to the next. The games are played by
+    <workers> worker processes, or one per core if <workers> is None.
+    """
+    tasks = []
+    for pair in itertools.combinations(kinds, 2):
+        for seed in range(first_seed, first_seed + games):
+            seats = list(pair) if seed % 2 == 0 else list(reversed(pair))
+            tasks.append((max_depth, seats, turns, seed))
+
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        results = list(pool.map(_play, tasks, chunksize=4))
+    return [(task[3], result) for task, result in zip(tasks, results)]
+
+
+def win_rates(results: List[Tuple[int, List[Tuple[str, int, int, int]]]]) \
+        -> Dict[str, Tuple[int, float]]:
+    """Return the number of games played and the fraction of them won by
+    each kind of player in <results>.
+
+    A game is won by the player with the highest score after penalties. Tied
+    players share the win.
+    """
+    played = {}
+    won = {}
+    for _, result in results:
+        totals = [score - penalty for _, score, penalty, _ in result]
+        best = max(totals)
+        winners = totals.count(best)
+        for (kind, _, _, _), total in zip(result, totals):
+            played[kind] = played.get(kind, 0) + 1
+            won[kind] = won.get(kind, 0) + (1 / winners if total == best
+                                            else 0)
+    return {kind: (played[kind], won[kind] / played[kind])
+            for kind in played}
+
+
+def write_results(path: str,
+                  results: List[Tuple[int, List[Tuple[str, int, int, int]]]]) \
+        -> None:
+    """Write <results> to a CSV file at <path>, with one row per game."""
+    seats = max(len(result) for _, result in results)
+    header = ['seed']
+    for i in range(seats):
+        header.extend(f'{column}{i}' for column in SEAT_COLUMNS)
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for seed, result in results:
+            row = [seed]
+            for seat in result:
+                row.extend(seat)
+            writer.writerow(row)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the tournament described by the command line arguments <argv>."""
+    parser = argparse.ArgumentParser(
+        description='Play seeded games between every pair of kinds of '
+                    'computer player.')
+    parser.add_argument('kinds', nargs='+',
+                        help='kinds of player, e.g. random smart:5 mcts:200')
+    parser.add_argument('--games', type=int, default=20,
+                        help='games per pair of kinds of player')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='maximum depth of the board')
+    parser.add_argument('--turns', type=int, default=10,
+                        help='turns per game')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game of each pair')
+    parser.add_argument('--output', default='results.csv',
+                        help='CSV file to write the result of each game to')
+    args = parser.parse_args(argv)
+    if len(args.kinds) < 2:
+        parser.error('at least two kinds of player are needed')
+    if not 2 <= args.depth <= MAX_DEPTH:
+        parser.error(f'the depth must be from 2 to {MAX_DEPTH}')
+    for kind in args.kinds:
+        try:
+            create_player(kind, 0, generate_goals(1))
+        except ValueError as error:
+            parser.error(str(error))
+
+    start = time.perf_counter()
+    results = run_tournament(args.kinds, args.games, args.depth, args.turns,
+                             args.workers, args.seed)
+    elapsed = time.perf_counter() - start
+    write_results(args.output, results)
+
+    print(f'{"player":>12} {"games":>6} {"win rate":>9}')
+    rates = win_rates(results)
+    for kind in args.kinds:
+        played, rate = rates[kind]
+        print(f'{kind:>12} {played:>6} {rate:>9.1%}')
+    print(f'{len(results)} games in {elapsed:.1f}s '
+          f'({len(results) / elapsed:.1f} games/s), '
+          f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()